@@ -0,0 +1,59 @@
+# Compile throughput of ristpy.rist() on large generated sources.
+#
+#   python benchmarks/bench_compile.py [--lines 10000 100000] [-r REPEAT]
+import time
+import argparse
+
+import ristpy
+
+
+BLOCK = '''@+ os, sys
++@ typing @+ Union, List
+
+compute${a: int, b: List[int]} -> int:
+  """Sum things up, {a} and (b)."""
+  total = 0
+  $f i in b:
+    if i % 2 == 0:
+      total += i * a
+    $ei i % 3 == 0:
+      $co
+    $e:
+      total -= i
+  $ret total  # return the total
+
+$fetch${session, url: str}:
+  data = ?session.get{url}
+  $ret ("url": url, "data": [data, {1, 2}])
+
+values = [compute{n, [1, 2, 3]} $f n in range{10}]
+$p{$s{values}, $x{True, False}, "done"}
+
+'''
+
+
+def make_source(lines: int) -> str:
+  block_lines = BLOCK.count("\n")
+  return BLOCK * max(1, lines // block_lines)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure ristpy compile throughput")
+  parser.add_argument("--lines", type=int, nargs="+", default=[10000, 100000])
+  parser.add_argument("-r", "--repeat", type=int, default=3)
+  args = parser.parse_args()
+
+  print(f"{'lines':>8} {'seconds':>9} {'lines/s':>10}")
+  for size in args.lines:
+    source = make_source(size)
+    count = source.count("\n")
+    best = float("inf")
+    for _ in range(args.repeat):
+      start = time.perf_counter()
+      ristpy.rist(source, fp=False)
+      best = min(best, time.perf_counter() - start)
+    print(f"{count:>8} {best:>9.3f} {count / best:>10.0f}")
+
+
+if __name__ == "__main__":
+  main()
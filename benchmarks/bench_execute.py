@@ -0,0 +1,43 @@
+# Repeated ristpy.execute() of the same compiled code. "fresh" drops the
+# memoised runner before every call, which is what each call used to cost.
+#
+#   python benchmarks/bench_execute.py [-n NUMBER] [-r REPEAT]
+import timeit
+import argparse
+
+import ristpy
+
+
+SCRIPT = """
+foo${a, b}:
+  $ret a + b
+
+total = 0
+for i in range{10}:
+  total = foo{total, i}
+"""
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure repeated ristpy.execute() of a small script")
+  parser.add_argument("-n", "--number", type=int, default=2000)
+  parser.add_argument("-r", "--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  code = ristpy.rist(SCRIPT, fp=False)
+
+  def fresh():
+    code._code_object = None
+    ristpy.execute(code)
+
+  def memoised():
+    ristpy.execute(code)
+
+  print(f"{'mode':<10} {'usec/call':>10}")
+  for name, func in (("fresh", fresh), ("memoised", memoised)):
+    best = min(timeit.Timer(func).repeat(args.repeat, args.number)) / args.number
+    print(f"{name:<10} {best * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,31 @@
+# A loop using $re, $s and $x run as translated and with the predefs hoisted
+# (optimize=1), which imports re and builds the $x lambda once instead of on
+# every iteration.
+#
+#   python benchmarks/bench_optimize.py [-i ITERATIONS] [-r REPEAT]
+import timeit
+import argparse
+
+import ristpy
+from ristpy.bench import make_loop
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure a predef heavy loop with and without hoisting")
+  parser.add_argument("-i", "--iterations", type=int, default=20000)
+  parser.add_argument("-r", "--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  source = make_loop(args.iterations)
+  print(f"{'optimize':<10} {'ms/run':>10} {'speedup':>8}")
+  plain = None
+  for optimize in (0, 1):
+    code = ristpy.rist(source, fp=False, optimize=optimize)
+    ristpy.execute(code)
+    best = min(timeit.Timer(lambda: ristpy.execute(code)).repeat(args.repeat, 1))
+    plain = plain or best
+    print(f"{optimize:<10} {best * 1e3:>10.2f} {plain / best:>7.2f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,41 @@
+# Per-call overhead of ristpy.rist() on small snippets.
+#
+#   python benchmarks/bench_overhead.py [-n NUMBER] [-r REPEAT]
+#
+# It measures whichever ristpy gets imported. The "before" numbers were
+# taken on the commit preceding the shared compiler (9227724), rist() had
+# the same signature there. To compare both from the repo root:
+#
+#   git worktree add --detach ../ristpy-before 9227724
+#   PYTHONPATH=../ristpy-before python benchmarks/bench_overhead.py -n 300 -r 3
+#   PYTHONPATH=. python benchmarks/bench_overhead.py -n 300 -r 3
+#   git worktree remove ../ristpy-before
+import timeit
+import argparse
+
+import ristpy
+
+
+SNIPPETS = {
+  "empty": "",
+  "print": '$p{"hello"}\n',
+  "funcdef": "foo${a, b}:\n  $ret a + b\n\n$p{foo{1, 2}}\n",
+  "imports": "@+ os, sys\n+@ typing @+ Union\n\nx: Union[int, str] = (1: [2, 3])\n",
+}
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure per-call overhead of ristpy.rist()")
+  parser.add_argument("-n", "--number", type=int, default=2000)
+  parser.add_argument("-r", "--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  print(f"{'snippet':<10} {'usec/call':>10}")
+  for name, code in SNIPPETS.items():
+    timer = timeit.Timer(lambda: ristpy.rist(code, fp=False))
+    best = min(timer.repeat(args.repeat, args.number)) / args.number
+    print(f"{name:<10} {best * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+  main()
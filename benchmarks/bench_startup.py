@@ -0,0 +1,27 @@
+# Start-up cost of ``import ristpy`` and of the rist command, from
+# ``python -X importtime``, with the modules costing the most.
+#
+#   python benchmarks/bench_startup.py [--top N]
+import argparse
+
+from ristpy.bench import import_times
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Measure the import time of ristpy and the rist command")
+  parser.add_argument("--top", type=int, default=10)
+  args = parser.parse_args()
+
+  for title, command in (("import ristpy", ("-c", "import ristpy")), ("rist --help", ("-m", "ristpy", "--help"))):
+    times = import_times(*command)
+    # Top level lines only, nested modules are part of their cumulative time
+    total = sum(t for name, _, t in times if not name.startswith(" "))
+    ristpy = sum(t for name, _, t in times if name.split(".")[0] == "ristpy")
+    print(f"{title}: {total / 1000:.1f} ms importing, {ristpy / 1000:.1f} ms of it under ristpy")
+    print(f"  {'self ms':>8}  module")
+    for name, own, _ in sorted(times, key=lambda t: -t[1])[:args.top]:
+      print(f"  {own / 1000:>8.2f}  {name.strip()}")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,115 +1,278 @@
 import os
-import json
-import atexit
+import sys
 import signal
 import argparse
+import json
+import contextlib
 
-from ristpy import rist, execute, E, W, encrypt, decrypt
+from ristpy import rist, C, E, W, D
+
+# Everything else is imported by the command using it, so starting rist
+# costs only what the command needs
 
 
 def init(parser, args):
-  if "ristconf.json" not in os.listdir():
-    return parser.error("A file named 'ristconf.json' should must be in the project directory")
+  from ristpy.project import Project
+  from ristpy.stats import phase
+
   try:
-    with open("ristconf.json", "r") as f: conf=json.load(f)
-  except Exception as e:
-    raise e
-
-  main=conf.get("main") or ""
-  assert bool(main) is True, "A setting named 'main' should must be in the config file"
-  assert main.endswith(".rist"), "Your main file should must be a rist file"
-  mf=main if "/" in main else "./"+main
-  macros = conf.get("snippets", {})
-  for name, snippet in macros.items():
-    if type(snippet) is list: macros[name] = "\n".join(snippet)
-      
-  macros_py = conf.get("snippets_py", {})
-  for name, snippet in macros_py.items():
-    if type(snippet) is list:
-      snippet = "\n".join(snippet)
-    macros_py[name] = snippet.splitlines()
-    
-  
-  for n, snippet in macros.items():
-    assert n not in macros_py, "Name of all the snippets should be unique"
-    macros_py[n] = rist(snippet, False, file=f"<macro_{n}>", macro_py=macros_py).splitlines()
-
-  dirs=conf.get("dirs") or []
-  ign=conf.get("ignore") or []
-  ign.append(mf)
-  if "." not in dirs: dirs.append(".")
-  pyfiles=[]
-  def rm():
-    for f in pyfiles:
-      try:os.remove(f)
-      except:continue
+    project = Project()
+  except FileNotFoundError as e:
+    return parser.error(str(e))
+  # Project modules are compiled on import, by the import hook
+  cache = args.cache_dir and os.path.abspath(args.cache_dir)
+  with timings(args):
+    if args.precompile:
+      with phase("build"):
+        report = project.build(cache, jobs=args.jobs)
+      for path, error in report.errors.items():
+        print(f"{os.path.relpath(path)}: {error.__class__.__name__}: {error}", file=sys.stderr)
+      print(report, file=sys.stderr)
+      if report.errors:
+        sys.exit(1)
+
+    if not args.subprocess:
+      return project.run(cache)
+
+  status = project.run_subprocess(cache)
+  if status < 0:
+    # Die from the same signal as the child did
+    signal.signal(-status, signal.SIG_DFL)
+    os.kill(os.getpid(), -status)
+  sys.exit(status)
+
+def build(parser, args):
+  from ristpy.project import Project
+
   try:
-    def mk(f):
-      nonlocal pyfiles
-      if f not in ign:
-        pyfiles.append(f[:-4]+"py")
-        rist(f, flags=W, compile_to=f[:-4]+"py", macros_py={**macros_py})
-    for dir in dirs:
-      if not dir.endswith("/"): dir+="/"
-      for file in os.listdir(dir):
-        if file.endswith(".rist"):
-          file=dir+file
-          mk(file)
-    mk(main)
-    atexit.register(rm)
-    signal.signal(signal.SIGTERM, rm)
-    signal.signal(signal.SIGINT, rm)
-    os.system(f'python3 {main[:-4]+"py"}')
-  except Exception as e:
-    rm()
-    raise e
-  finally:
-    rm()
+    project = Project()
+  except FileNotFoundError as e:
+    return parser.error(str(e))
+  cache = args.cache_dir and os.path.abspath(args.cache_dir)
+  report = project.bundle(args.output, cache, args.jobs, args.python, args.optimize, args.compress)
+  for path, error in report.errors.items():
+    print(f"{os.path.relpath(path)}: {error.__class__.__name__}: {error}", file=sys.stderr)
+  print(report, file=sys.stderr)
+  if report.errors:
+    sys.exit(1)
+  print(f"wrote {args.output}, run it with: python {args.output}", file=sys.stderr)
+
+def watch(parser, args):
+  from ristpy.watch import Watcher
+
+  try:
+    watcher = Watcher(cache=args.cache_dir, interval=args.interval, restart=args.restart)
+  except FileNotFoundError as e:
+    return parser.error(str(e))
+  watcher.run()
+
+def compile_to(parser, to_read, to_write, cache=None, timings=False, optimize=0):
+  from ristpy.stream import compile_stream
 
-def compile_to(parser, to_read, to_write):
   if not to_read.endswith(".rist"):
     return parser.error("You must provide the file which is to be to compiled, with extension '.rist'")
   try:
-    rist(to_read, flags=W, compile_to=to_write)
+    if cache is None and not timings and not optimize:
+      compile_stream(to_read, to_write)
+    else:
+      # Hoisting writes the predefs before the code, it needs the whole of it
+      rist(to_read, flags=W, compile_to=to_write, cache=cache, optimize=optimize)
   except OSError as exc:
     parser.error(f'could not create file ({exc})')
   else:
     print('successfully compiled code at', to_write)
 
-def compile_and_run(parser, fp: str):
+def compile_and_run(parser, fp: str, cache=None, optimize=0):
   if not fp.endswith(".rist"):
     return parser.error("You must provide file with extension '.rist'")
-  rist(fp,flags=E)
+  rist(fp,flags=E,cache=cache,optimize=optimize)
+
+def run_encrypted(parser, args, cache=None):
+  from ristpy import execute
+
+  # Decrypted in memory only, nothing but the compiled runner is cached
+  if not args.key: return parser.error("You must provide a 'key' to run encrypted code")
+  try:
+    code = rist(args.file, flags=C|D, cache=cache, key=args.key, depth=args.depth)
+  except OSError as e:
+    return parser.error(f"could not read the file ({e})")
+  except ValueError as e:
+    # A wrong key or depth, UnicodeDecodeError included. Errors of the
+    # program itself are raised as they are, it runs after.
+    return parser.error(f"could not decrypt the file ({e.__class__.__name__}: {e})")
+  except SyntaxError as e:
+    # The text format decrypts with any key, to something which is not rist
+    return parser.error(f"could not decrypt the file, or it is not valid rist ({e})")
+  execute(code)
 
 def compile_fp(parser, args):
-  if args.compile_to:
-    compile_to(parser, args.file, args.compile_to)
-  compile_and_run(parser, args.file)
+  from ristpy.cache import get_cache
+
+  cache = get_cache(args.cache_dir)
+  if args.encrypted:
+    if args.compile_to:
+      return parser.error("--compile-to can not be used with --encrypted, it would write the plaintext")
+    with timings(args):
+      return run_encrypted(parser, args, cache)
+  with timings(args):
+    if args.compile_to:
+      compile_to(parser, args.file, args.compile_to, cache, optimize=args.optimize)
+    compile_and_run(parser, args.file, cache, args.optimize)
+
+def compile_only(parser, args):
+  from ristpy.cache import get_cache
+
+  with timings(args):
+    compile_to(parser, args.file, args.output, get_cache(args.cache_dir), args.timings or args.trace_memory, args.optimize)
+
+@contextlib.contextmanager
+def timings(args):
+  # Prints the time spent in each phase to stderr, with --timings
+  if not args.timings and not args.trace_memory:
+    yield
+    return
+  from ristpy.stats import CompileStats
+  stats = CompileStats(trace_memory=args.trace_memory)
+  try:
+    with stats:
+      yield
+  finally:
+    print(stats, file=sys.stderr)
+
+def load_project(parser):
+  # The project in the current directory, None outside of one, for its snippets
+  if not os.path.isfile("ristconf.json"):
+    return None
+  from ristpy.project import Project
+  try:
+    return Project()
+  except (AssertionError, ValueError) as e:
+    parser.error(f"could not load ristconf.json ({e})")
+
+def profile_fp(parser, args):
+  from ristpy.importer import uninstall
+  from ristpy.profiler import profile
+
+  if not args.file.endswith(".rist"):
+    return parser.error("You must provide file with extension '.rist'")
+  project = load_project(parser)
+  if project is None:
+    return profile(args.file, top=args.top)
+  # With the project's snippets, and its modules importable like rist init
+  finder = project.install_importer()
+  sys.path.insert(0, project.root)
+  try:
+    profile(args.file, project.macros, project.macros_py, top=args.top)
+  finally:
+    sys.path.remove(project.root)
+    uninstall(finder)
+
+def bench(parser, args):
+  from ristpy.bench import run as run_benchmarks, compare as compare_benchmarks
+
+  baseline = None
+  if args.compare:
+    try:
+      with open(args.compare, "r") as f:
+        baseline = json.load(f)
+    except (OSError, ValueError) as e:
+      return parser.error(f"could not read the baseline ({e})")
+
+  results = run_benchmarks(quick=args.quick, repeat=args.repeat)
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(results, f, indent=2)
+  else:
+    print(json.dumps(results, indent=2))
+  if baseline is None:
+    return
+
+  regressions = compare_benchmarks(results, baseline, args.threshold)
+  for r in regressions:
+    print(f"regression: {r['metric']} {r['baseline']:.4g} -> {r['value']:.4g} ({r['change']:+.1%})", file=sys.stderr)
+  if regressions:
+    sys.exit(1)
+
+def check(parser, args):
+  from ristpy.check import check_paths, find_sources, as_dict
+
+  macros = macros_py = None
+  paths = args.paths
+  project = load_project(parser)
+  if project is not None:
+    # The project's snippets, and its files when none are given
+    macros, macros_py = project.macros, project.macros_py
+    if not paths:
+      paths = project.files() + [project.main]
+  elif not paths:
+    return parser.error("Give the files or directories to check, or run it in a project")
+
+  files = find_sources(paths)
+  try:
+    results = check_paths(files, args.jobs, macros, macros_py)
+  except ValueError as e:
+    return parser.error(str(e))
+  errors = [error for path in files for error in results[path]]
+  if args.json:
+    print(json.dumps({"files": len(files), "errors": [as_dict(e) for e in errors]}, indent=2))
+  else:
+    for e in errors:
+      location = ":".join(str(part) for part in (os.path.relpath(e.filename), e.lineno, e.offset) if part is not None)
+      print(f"{location}: {e.msg}")
+    failed = sum(1 for path in files if results[path])
+    print(f"checked {len(files)} files, {len(errors)} errors in {failed} files", file=sys.stderr)
+  if errors:
+    sys.exit(1)
+
+def cache_info(parser, args):
+  from ristpy.cache import get_cache
+
+  cache = get_cache(args.cache_dir)
+  if cache is None:
+    return parser.error("No cache directory given, pass --cache-dir or set RIST_CACHE_DIR")
+  if args.clear:
+    print("removed", cache.clear(), "entries from", cache.directory)
+    return
+  entries = cache.entries()
+  size = sum(e.stat().st_size for e in entries)
+  print(f"{cache.directory}: {len(entries)} entries, {size} bytes (max {cache.max_size})")
 
 def enc(parser, args):
+  import random
+  from ristpy.crypt import encrypt, encrypt_stream, armor
+
   try:
-    arg,depth,key = args.arg,1,True
-    if args.filepath: arg = open(args.arg).read()
-    if args.depth: depth=args.depth
-    if args.key: key = False
-    code = encrypt(arg,args.key,depth=depth)
-    if key: code,key=code
-    if args.output:
-      with open(args.output,"w") as f: f.write(code)
-    else: print("Encryption success\n\n",code)
-    if key: print("\n\n Your encryption key is:",str(key),"\nPlz don't forget it, it is used to decrypt encrypted thing")
+    depth = args.depth or 1
+    key = args.key or random.randint(1, 100)
+    if args.filepath and args.output and not args.legacy:
+      # Files are encrypted a chunk at a time
+      encrypt_stream(args.arg, args.output, key, depth=depth)
+    else:
+      arg = args.arg
+      if args.filepath: arg = open(args.arg).read()
+      code = encrypt(arg, key, depth=depth, legacy=args.legacy)
+      if args.output:
+        with open(args.output, "w" if args.legacy else "wb") as f: f.write(code)
+      else: print("Encryption success\n\n", code if args.legacy else armor(code))
+    if not args.key: print("\n\n Your encryption key is:",str(key),"\nPlz don't forget it, it is used to decrypt encrypted thing")
   except Exception as e:
     parser.error(e.__class__.__name__+": "+str(e))
 
 def dec(parser, args):
+  from ristpy.crypt import decrypt, decrypt_stream, is_encrypted
+
   try:
     arg,depth = args.arg,1
     if not args.key: return parser.error("You must provide a 'key' for decryption")
-    if args.filepath: arg = open(args.arg).read()
     if args.depth: depth=args.depth
+    if args.filepath:
+      with open(args.arg, "rb") as f: arg = f.read()
+      if args.output and is_encrypted(arg):
+        return decrypt_stream(args.arg, args.output, args.key, depth=depth)
+      if not is_encrypted(arg): arg = arg.decode()
     code = decrypt(arg,args.key,depth=depth)
     if args.output:
-      with open(args.output,"w") as f: f.write(code)
+      with open(args.output,"w" if isinstance(code, str) else "wb") as f: f.write(code)
     else: print("Decryption success\n\n",code)
   except Exception as e:
     parser.error(e.__class__.__name__+": "+str(e))
@@ -119,21 +282,83 @@ def parse_args():
   _parser_.set_defaults(func=(lambda p,a: None))
   _parser = _parser_.add_subparsers(dest="subcommands",title="subcommands")
 
-  runner = _parser.add_parser('init', help="Compile and run rist files in bulk")
+  runner = _parser.add_parser('init', help="Run a rist project, compiling its files as they are imported")
 
   runner.set_defaults(func=init)
+  runner.add_argument('--cache-dir', help='Directory of the compile cache (default: $RIST_CACHE_DIR)', type=str, metavar="<dir>")
+  runner.add_argument('--timings', help='Print the time spent reading, translating, compiling and running', action='store_true')
+  runner.add_argument('--trace-memory', help='Also print the peak memory of each phase (implies --timings)', action='store_true')
+  runner.add_argument('--precompile', help='Compile the out of date project files before running', action='store_true')
+  runner.add_argument('--jobs', '-j', help='Number of processes compiling the project (default: cpu count)', type=int, metavar="<n>")
+  runner.add_argument('--subprocess', help='Run main in a separate python process instead of this one', action='store_true')
+
+  builder = _parser.add_parser('build', help="Compile a rist project into a zip application which runs without rist")
+
+  builder.set_defaults(func=build)
+  builder.add_argument('--output', '-O', help='The file to write (default: bundle.pyz)', type=str, default="bundle.pyz", metavar="<filepath>")
+  builder.add_argument('--cache-dir', help='Directory of the compile cache (default: $RIST_CACHE_DIR)', type=str, metavar="<dir>")
+  builder.add_argument('--jobs', '-j', help='Number of processes compiling the project (default: cpu count)', type=int, metavar="<n>")
+  builder.add_argument('--python', '-p', help='Interpreter of a "#!" line, making the file executable', type=str, metavar="<interpreter>")
+  builder.add_argument('--optimize', help='Optimization level of the bytecode, like python -O (default: the current one)', type=int, default=-1, choices=[-1, 0, 1, 2])
+  builder.add_argument('--compress', help='Deflate the bytecode, smaller but slower to load', action='store_true')
+
+  watcher = _parser.add_parser('watch', help="Recompile the project files as they change")
+
+  watcher.set_defaults(func=watch)
+  watcher.add_argument('--cache-dir', help='Directory of the compile cache (default: $RIST_CACHE_DIR)', type=str, metavar="<dir>")
+  watcher.add_argument('--interval', help='Seconds between two scans of the project (default: 0.5)', type=float, default=0.5, metavar="<seconds>")
+  watcher.add_argument('--restart', help='Run main in a subprocess and restart it after every successful rebuild', action='store_true')
 
   parser = _parser.add_parser("run",help="Run and compile any rist code")
 
   parser.set_defaults(func=compile_fp)
   parser.add_argument('file', type=str, help='The file to be compiled in python')
   parser.add_argument('--compile-to', '-CT', help='Compiles the code, write in the provided file and then executes it', type=str, metavar="<filepath>")
+  parser.add_argument('--cache-dir', help='Directory of the compile cache (default: $RIST_CACHE_DIR)', type=str, metavar="<dir>")
+  parser.add_argument('--timings', help='Print the time spent reading, translating, compiling and running', action='store_true')
+  parser.add_argument('--trace-memory', help='Also print the peak memory of each phase (implies --timings)', action='store_true')
+  parser.add_argument('--optimize', help='Define the predefs which build something ($re, $x, $eval) once at the top, not on every use', action='count', default=0)
+  parser.add_argument('--encrypted', help='The file is encrypted, it is decrypted in memory and run', action='store_true')
+  parser.add_argument('--key', '-K', help='The key to decrypt the file with --encrypted (must be integer)', type=int, metavar="<key>")
+  parser.add_argument('--depth', '-D', help='The depth/layer of the encryption with --encrypted (default: 1)', type=int, default=1)
+
+  profiler = _parser.add_parser("profile", help="Run rist code and show where its time went, by rist line")
+
+  profiler.set_defaults(func=profile_fp)
+  profiler.add_argument('file', type=str, help='The file to be profiled')
+  profiler.add_argument('--top', help='Number of functions and lines shown (default: 20)', type=int, default=20, metavar="<n>")
 
   writer = _parser.add_parser("compile",help="Compile any rist code")
 
-  writer.set_defaults(func=(lambda p,a: compile_to(p, a.file, a.output)))
+  writer.set_defaults(func=compile_only)
   writer.add_argument('file', type=str, help='The file to be compiled')
   writer.add_argument('output', type=str, help='The file where compiled code would be written')
+  writer.add_argument('--cache-dir', help='Directory of the compile cache (default: $RIST_CACHE_DIR)', type=str, metavar="<dir>")
+  writer.add_argument('--timings', help='Print the time spent reading, translating, compiling and running', action='store_true')
+  writer.add_argument('--trace-memory', help='Also print the peak memory of each phase (implies --timings)', action='store_true')
+  writer.add_argument('--optimize', help='Define the predefs which build something ($re, $x, $eval) once at the top, not on every use', action='count', default=0)
+
+  checker = _parser.add_parser("check", help="Report every syntax error of rist files, without compiling them")
+
+  checker.set_defaults(func=check)
+  checker.add_argument('paths', nargs='*', help='Files and directories to check (default: the project in the current directory)', metavar="<path>")
+  checker.add_argument('--json', help='Print the errors as JSON', action='store_true')
+  checker.add_argument('--jobs', '-j', help='Number of processes checking files (default: cpu count)', type=int, metavar="<n>")
+
+  cacher = _parser.add_parser("cache", help="Inspect or clear the compile cache")
+
+  cacher.set_defaults(func=cache_info)
+  cacher.add_argument('--cache-dir', help='Directory of the compile cache (default: $RIST_CACHE_DIR)', type=str, metavar="<dir>")
+  cacher.add_argument('--clear', help='Remove every entry of the cache', action='store_true')
+
+  bencher = _parser.add_parser("bench", help="Benchmark the compiler, executor and encryption on generated sources")
+
+  bencher.set_defaults(func=bench)
+  bencher.add_argument('--output', '-O', help='Write the results to this JSON file instead of printing them', type=str, metavar="<filepath>")
+  bencher.add_argument('--compare', help='Fail when a result is worse than in this earlier JSON output', type=str, metavar="<filepath>")
+  bencher.add_argument('--threshold', help='How much worse a result may be than the baseline (default: 0.1, 10%%)', type=float, default=0.1, metavar="<fraction>")
+  bencher.add_argument('--repeat', '-r', help='Runs of each benchmark, the best one counts (default: 3)', type=int, default=3, metavar="<n>")
+  bencher.add_argument('--quick', help='Smaller corpora, for a fast check', action='store_true')
 
   subp_e = _parser.add_parser("encrypt", help="Encrypt any thing")
 
@@ -143,6 +368,7 @@ def parse_args():
   subp_e.add_argument("--depth","-D",help="The depth/layer for encryption (must be integer, default: 1)", type=int, default=1)
   subp_e.add_argument("--filepath","-FP",help="Provide when the argument is a filepath",action='store_true')
   subp_e.add_argument("--output","-O",help="The output file where the encrypted thing will be written, will print if not given",type=str, default=None)
+  subp_e.add_argument("--legacy",help="Use the old text format, which is much bigger",action='store_true')
 
   subp_d = _parser.add_parser("decrypt", help="Decrypt any thing")
 
@@ -0,0 +1,115 @@
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from . import RistFlags, C, _parse_flags
+from .cache import CompileCache, get_cache, compile_cached
+from .compiler import CompiledCode
+from .importer import compile_module
+from .snippets import SnippetRegistry
+
+
+__all__ = ("CompileResult", "compile_many")
+
+
+class CompileResult:
+  # Outcome of one file of compile_many(), ``code`` is None when it failed
+  __slots__ = ("path", "code", "error", "seconds")
+
+  def __init__(self, path: str, code: Optional[CompiledCode], error: Optional[Exception], seconds: float) -> None:
+    self.path = path
+    self.code = code
+    self.error = error
+    self.seconds = seconds
+
+  @property
+  def ok(self) -> bool:
+    return self.error is None
+
+  def __repr__(self) -> str:
+    state = "ok" if self.error is None else f"error={self.error!r}"
+    return f"<CompileResult {self.path!r} {state} {self.seconds * 1000:.3f}ms>"
+
+
+class _Batch:
+  # What every worker does with a path. Process workers get it once, when
+  # they start, and keep its snippets and cache for all their files.
+  def __init__(self, macro_py: SnippetRegistry, cache: Optional[CompileCache], write: bool, module: bool) -> None:
+    self.macro_py = macro_py
+    self.cache = cache
+    self.write = write
+    self.module = module
+
+  def __call__(self, path: str) -> tuple:
+    # Only what pickles comes back, the python and its line map
+    start = time.perf_counter()
+    try:
+      if self.module:
+        python, line_map = compile_module(path, self.macro_py, self.cache)[0], None
+      else:
+        with open(path, "r") as f:
+          code = compile_cached(f.read(), path, self.macro_py, self.cache)
+        python, line_map = str(code), code.line_map
+      if self.write:
+        with open(os.path.splitext(path)[0] + ".py", "w") as f:
+          f.write(python)
+    except Exception as e:
+      return path, None, None, e, time.perf_counter() - start
+    return path, python, line_map, None, time.perf_counter() - start
+
+
+_worker_batch: Optional[_Batch] = None
+
+def _init_worker(batch: _Batch) -> None:
+  global _worker_batch
+  _worker_batch = batch
+
+def _run_worker(path: str) -> tuple:
+  return _worker_batch(path)
+
+
+def compile_many(
+  paths: Iterable[str],
+  workers: int = None,
+  flags: RistFlags = C,
+  macros: Dict[str, str] = None,
+  macros_py: Dict[str, List[str]] = None,
+  cache=None,
+  threads: bool = False,
+  module: bool = False
+) -> List[CompileResult]:
+  # Compiles rist files across ``workers`` processes (every cpu by default),
+  # one result per path, in order. Failing files give their exception in the
+  # result rather than raising. With the WRITE flag, ``name.rist`` is written
+  # to ``name.py`` next to it. ``threads`` uses a thread pool instead, which
+  # only pays off where the lexer runs without the GIL. ``module`` compiles
+  # as imported modules rather than runners, for the import cache.
+  paths = list(paths)
+  flags = _parse_flags(flags)
+  if flags.EXECUTE or flags.DECRYPT:
+    raise ValueError('Only "COMPILE" and "WRITE" flags can be used with compile_many')
+  if macros or (macros_py and not isinstance(macros_py, SnippetRegistry)):
+    macros_py = SnippetRegistry(macros, macros_py)
+  batch = _Batch(macros_py or {}, get_cache(cache), flags.WRITE, module)
+
+  workers = min(workers or os.cpu_count() or 1, len(paths))
+  if workers <= 1:
+    results = map(batch, paths)
+  elif threads:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+      results = list(pool.map(batch, paths))
+  else:
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(batch,)) as pool:
+      # A few chunks per worker, small files cost less than sending them
+      results = list(pool.map(_run_worker, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+  out = []
+  for path, python, line_map, error, seconds in results:
+    code = None
+    if error is None:
+      code = CompiledCode.setup(python, path)
+      code.line_map = line_map
+    out.append(CompileResult(path, code, error, seconds))
+  return out
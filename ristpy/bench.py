@@ -0,0 +1,230 @@
+import sys
+import time
+import random
+import platform
+import subprocess
+import tracemalloc
+
+from typing import Dict, List, Tuple
+
+from . import __version__, rist, encrypt, decrypt
+from .compiler import get_compiler
+from .executor import Scope, run_compiled
+from .snippets import SnippetRegistry
+from .stats import _reset_peak
+
+
+__all__ = ("make_corpus", "make_loop", "SNIPPETS", "import_times", "run", "compare")
+
+
+# Snippets used by the corpus, ``%- name -%``
+SNIPPETS = {
+  "macros": {
+    "log_start": '$p{"start", __name__}\ncount = 0',
+  },
+  "macros_py": {
+    "guard": ["if count > 1000:", "    raise RuntimeError('too many')"],
+  },
+}
+
+_IMPORTS = ["@+ os, sys", "@+ collections.abc", "+@ typing @+ Union, List", "+@ functools @+ {partial,\n  reduce}"]
+_CASTS = ["$i{i}", "$l{[i]}[0]", "$u{{i,}}[0]", "$d{v=i}['v']"]
+
+
+def _function(rng: random.Random, n: int) -> List[str]:
+  name = f"func_{n}"
+  asynchronous = rng.random() < 0.25
+  lines = [
+    f"{'$' if asynchronous else ''}{name}${{a: int, b: List[int] = [1, 2]}} -> int:",
+    f'  """Docstring of {name}, it keeps (brackets) and {{braces}} as they are.',
+    "",
+    '  Over more than one line."""',
+    "  total = 0",
+    "  $f i in b:",
+    f"    if i % {rng.randint(2, 9)} == 0:",
+    "      total += i * a  # comment with $p{not translated}",
+    f"    $ei i % {rng.randint(2, 9)} == 0:",
+    "      $co",
+    "    $e:",
+    f"      total -= {rng.choice(_CASTS)}",
+  ]
+  if asynchronous:
+    lines.append(f"  data = ?fetch{{(\"n\": {n}, \"values\": [a, {{1, 2}}])}}")
+  lines.append("  $ret total")
+  lines.append("")
+  if not asynchronous:
+    lines.append(f"values_{n} = [{name}{{k, [1, 2, 3]}} $f k in range{{{rng.randint(1, 5)}}}]")
+    lines.append(f"$p{{$s{{values_{n}}}, $x{{True, False}}, 'done'}}")
+  return lines
+
+def make_corpus(lines: int, seed: int = 0) -> str:
+  # A rist source of about ``lines`` lines, the same for the same seed, using
+  # function defs, predefs, both imports, swapped brackets, docstrings and
+  # snippets
+  rng = random.Random(seed)
+  out = ["%- log_start -%", "+@ typing @+ List", ""]
+  n = 0
+  while len(out) < lines:
+    out.append(rng.choice(_IMPORTS))
+    out.extend(_function(rng, n))
+    if rng.random() < 0.2:
+      out.append("%- guard -%")
+    out.append("")
+    n += 1
+  return "\n".join(out) + "\n"
+
+def make_loop(iterations: int) -> str:
+  # A loop using the predefs which an optimized translation hoists
+  return "\n".join([
+    "count = 0",
+    f"$f i in range{{{iterations}}}:",
+    "  if $re.match{'[0-9]', $s{i}} and $x{i % 3 == 0, i % 5 == 0}:",
+    "    count += 1",
+    "",
+  ])
+
+
+def _best(func, repeat: int) -> float:
+  best = float("inf")
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+def _snippets() -> SnippetRegistry:
+  return SnippetRegistry(SNIPPETS["macros"], SNIPPETS["macros_py"])
+
+def bench_compile(sizes: List[int], repeat: int) -> Dict[str, dict]:
+  compiler, snippets = get_compiler(), _snippets()
+  metrics = {}
+  for size in sizes:
+    source = make_corpus(size)
+    count = source.count("\n")
+    seconds = _best(lambda: compiler.compile(source, "<bench.rist>", snippets), repeat)
+    metrics[f"compile.{size}.lines_per_second"] = _metric(count / seconds, "lines/s", "higher")
+  return metrics
+
+def bench_memory(size: int) -> Dict[str, dict]:
+  compiler, snippets = get_compiler(), _snippets()
+  source = make_corpus(size)
+  compiler.compile(source, "<bench.rist>", snippets)
+  tracing = tracemalloc.is_tracing()
+  if not tracing:
+    tracemalloc.start()
+  elif _reset_peak is not None:
+    _reset_peak()
+  base, base_peak = tracemalloc.get_traced_memory()
+  compiler.compile(source, "<bench.rist>", snippets)
+  current, peak = tracemalloc.get_traced_memory()
+  if tracing and _reset_peak is None and peak <= base_peak:
+    # The peak is from before the compile, Python 3.8 can not reset it,
+    # what the compile still holds is all that is known
+    peak = current
+  peak -= base
+  if not tracing:
+    tracemalloc.stop()
+  return {"compile.memory.bytes_per_kloc": _metric(peak / (source.count("\n") / 1000), "bytes", "lower")}
+
+def bench_execute(number: int, repeat: int) -> Dict[str, dict]:
+  code = rist(make_corpus(60), fp=False, macros=SNIPPETS["macros"], macros_py=SNIPPETS["macros_py"])
+  silent = {"print": lambda *args, **kwargs: None}
+  # Once before timing, for the imports the runner makes
+  _execute(code, silent)
+
+  def first():
+    code._code_object = None
+    _execute(code, silent)
+  def again():
+    _execute(code, silent)
+
+  return {
+    "execute.first.usec": _metric(_best(first, repeat) * 1e6, "usec", "lower"),
+    "execute.repeat.usec": _metric(_best(lambda: [again() for _ in range(number)], repeat) / number * 1e6, "usec", "lower"),
+  }
+
+def _execute(code, globals_: dict) -> None:
+  run_compiled(code, Scope({**globals_}))
+
+def bench_optimize(iterations: int, repeat: int) -> Dict[str, dict]:
+  # The same loop translated as it is and with the predefs hoisted
+  source = make_loop(iterations)
+  metrics = {}
+  for name, optimize in (("plain", 0), ("optimized", 1)):
+    code = get_compiler().compile(source, "<bench.rist>", optimize=optimize)
+    _execute(code, {})
+    metrics[f"execute.loop.{name}.usec"] = _metric(_best(lambda: _execute(code, {}), repeat) * 1e6, "usec", "lower")
+  return metrics
+
+def bench_encrypt(size: int, depth: int, repeat: int) -> Dict[str, dict]:
+  text = make_corpus(size)
+  megabytes = len(text.encode()) / 1e6
+  encrypted = encrypt(text, 7, depth=depth)
+  return {
+    f"encrypt.depth{depth}.mb_per_second": _metric(megabytes / _best(lambda: encrypt(text, 7, depth=depth), repeat), "MB/s", "higher"),
+    f"decrypt.depth{depth}.mb_per_second": _metric(megabytes / _best(lambda: decrypt(encrypted, 7, depth=depth), repeat), "MB/s", "higher"),
+  }
+
+def import_times(*args: str) -> List[Tuple[str, int, int]]:
+  # ``(module, self usec, cumulative usec)`` of every module a fresh python
+  # imports running ``args``, from ``-X importtime``. Nested modules keep the
+  # indent it gives them.
+  proc = subprocess.run(
+    [sys.executable, "-X", "importtime", *args],
+    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+  )
+  times = []
+  for line in proc.stderr.splitlines():
+    if not line.startswith("import time:") or "|" not in line:
+      continue
+    own, total, name = line[len("import time:"):].split("|", 2)
+    if own.strip().isdigit():
+      times.append((name[1:], int(own), int(total)))
+  return times
+
+def bench_startup(repeat: int) -> Dict[str, dict]:
+  def imported(*args):
+    # Cumulative time of the ristpy modules imported at the top level
+    return sum(total for name, _, total in import_times(*args) if name.split(".")[0] == "ristpy")
+  def cli():
+    subprocess.run([sys.executable, "-m", "ristpy", "--help"], stdout=subprocess.DEVNULL, check=True)
+  return {
+    "startup.import.usec": _metric(min(imported("-c", "import ristpy") for _ in range(repeat)), "usec", "lower"),
+    "startup.cli.usec": _metric(_best(cli, repeat) * 1e6, "usec", "lower"),
+  }
+
+def _metric(value: float, unit: str, better: str) -> dict:
+  return {"value": value, "unit": unit, "better": better}
+
+
+def run(quick: bool = False, repeat: int = 3) -> dict:
+  # Every benchmark, as ``{"metrics": {name: {"value", "unit", "better"}}}``
+  sizes = [1000, 10000] if quick else [1000, 10000, 100000]
+  metrics = {}
+  metrics.update(bench_compile(sizes, repeat))
+  metrics.update(bench_memory(10000))
+  metrics.update(bench_execute(20 if quick else 200, repeat))
+  metrics.update(bench_optimize(2000 if quick else 20000, repeat))
+  metrics.update(bench_encrypt(200 if quick else 2000, 1, repeat))
+  metrics.update(bench_encrypt(20, 2, repeat))
+  metrics.update(bench_startup(repeat))
+  return {
+    "ristpy": __version__,
+    "python": platform.python_version(),
+    "implementation": sys.implementation.name,
+    "platform": platform.platform(),
+    "metrics": metrics,
+  }
+
+def compare(results: dict, baseline: dict, threshold: float = 0.1) -> List[dict]:
+  # Metrics worse than the baseline by more than ``threshold`` (a fraction)
+  regressions = []
+  for name, metric in results["metrics"].items():
+    base = baseline.get("metrics", {}).get(name)
+    if base is None or not base["value"]:
+      continue
+    change = metric["value"] / base["value"] - 1
+    worse = -change if metric["better"] == "higher" else change
+    if worse > threshold:
+      regressions.append({"metric": name, "baseline": base["value"], "value": metric["value"], "change": change})
+  return regressions
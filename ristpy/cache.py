@@ -0,0 +1,270 @@
+import os
+import sys
+import time
+import marshal
+import hashlib
+import tempfile
+import threading
+import importlib.util
+
+from types import CodeType
+from typing import Dict, List, Optional, Tuple, Union
+
+from . import __version__
+from .compiler import CompiledCode, get_compiler
+from .snippets import SnippetRegistry, snippets_digest
+from .stats import phase, count_source
+from .crypt import decrypt
+from .executor import compile_runner
+
+
+__all__ = (
+  "CacheStats", "CompileCache",
+  "get_cache", "default_cache_dir", "snippets_digest", "compile_cached", "compile_encrypted",
+)
+
+# Entries are ``_MAGIC + marshal.dumps((python_source, code_object_or_None))``
+_MAGIC = b"RIST" + importlib.util.MAGIC_NUMBER
+_SUFFIX = ".rpyc"
+# A hit only marks an entry as used again when it was last marked longer ago
+# than this, so hits are reads, and eviction is least recently used by day
+_TOUCH_AFTER = 24 * 60 * 60
+
+
+class CacheStats:
+  __slots__ = ("hits", "misses", "stores", "evictions")
+
+  def __init__(self) -> None:
+    self.hits = self.misses = self.stores = self.evictions = 0
+
+  def __repr__(self) -> str:
+    return "<CacheStats hits={0.hits} misses={0.misses} stores={0.stores} evictions={0.evictions}>".format(self)
+
+
+class CompileCache:
+  def __init__(self, directory: str, max_size: int = 64 * 1024 * 1024) -> None:
+    self.directory = os.path.abspath(directory)
+    self.max_size = max_size
+    self.stats = CacheStats()
+    self._size = None
+    self._lock = threading.Lock()
+
+  def __reduce__(self):
+    # Worker processes get their own, with empty stats
+    return CompileCache, (self.directory, self.max_size)
+
+  def key(self, source: Union[str, bytes], fname: str = "", snippets: str = "", mode: str = "runner") -> str:
+    # ``mode`` tells apart code objects compiled differently from the same source
+    h = hashlib.sha256()
+    for part in (__version__, sys.implementation.cache_tag, mode, fname, snippets):
+      h.update(str(part).encode())
+      h.update(b"\0")
+    h.update(source.encode() if isinstance(source, str) else source)
+    return h.hexdigest()
+
+  def path(self, key: str) -> str:
+    return os.path.join(self.directory, key + _SUFFIX)
+
+  def load(self, key: str) -> Optional[Tuple[str, Optional[CodeType]]]:
+    path = self.path(key)
+    try:
+      with open(path, "rb") as f:
+        data = f.read()
+        mtime = os.fstat(f.fileno()).st_mtime
+      if not data.startswith(_MAGIC):
+        raise ValueError("bad magic")
+      source, code = marshal.loads(data[len(_MAGIC):])
+    except FileNotFoundError:
+      self._count("misses")
+      return None
+    except (OSError, ValueError, EOFError, TypeError):
+      # Corrupted or written by another interpreter, drop it
+      self._count("misses")
+      self._remove(path)
+      return None
+
+    if time.time() - mtime > _TOUCH_AFTER:
+      try:
+        os.utime(path)
+      except OSError:
+        pass
+    self._count("hits")
+    return source, code
+
+  def store(self, key: str, source: str, code: CodeType = None) -> None:
+    data = _MAGIC + marshal.dumps((source, code))
+    os.makedirs(self.directory, exist_ok=True)
+    # Written next to the entry and renamed over it, readers never see half a file
+    path = self.path(key)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=_SUFFIX, dir=self.directory)
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(data)
+      # An entry written over only grows the cache by the difference
+      try:
+        replaced = os.stat(path).st_size
+      except FileNotFoundError:
+        replaced = 0
+      os.replace(tmp, path)
+    except BaseException:
+      self._remove(tmp)
+      raise
+
+    with self._lock:
+      self.stats.stores += 1
+      if self._size is not None:
+        self._size += len(data) - replaced
+      size = self._size
+    if size is None:
+      # Counted once on the first store, this entry included
+      size = self.size()
+      with self._lock:
+        self._size = size
+    if size > self.max_size:
+      self.evict()
+
+  def entries(self) -> List[os.DirEntry]:
+    try:
+      with os.scandir(self.directory) as it:
+        return [e for e in it if e.name.endswith(_SUFFIX) and not e.name.startswith(".")]
+    except FileNotFoundError:
+      return []
+
+  def size(self) -> int:
+    return sum(e.stat().st_size for e in self.entries())
+
+  def evict(self) -> int:
+    # Drops the least recently used entries until the cache fits max_size
+    entries = []
+    for e in self.entries():
+      try:
+        st = e.stat()
+      except FileNotFoundError:
+        continue
+      entries.append((st.st_mtime, st.st_size, e.path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    while entries and total > self.max_size:
+      _, size, path = entries.pop(0)
+      if self._remove(path):
+        removed += 1
+      total -= size
+
+    with self._lock:
+      self.stats.evictions += removed
+      self._size = total
+    return removed
+
+  def clear(self) -> int:
+    removed = 0
+    for e in self.entries():
+      if self._remove(e.path):
+        removed += 1
+    with self._lock:
+      self._size = 0
+    return removed
+
+  def _count(self, stat: str) -> None:
+    with self._lock:
+      setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+  @staticmethod
+  def _remove(path: str) -> bool:
+    try:
+      os.remove(path)
+    except OSError:
+      return False
+    return True
+
+
+_caches: Dict[str, CompileCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache(cache: Union[CompileCache, str, None] = None) -> Optional[CompileCache]:
+  # The cache is opt-in, either passed explicitly or through $RIST_CACHE_DIR
+  if isinstance(cache, CompileCache):
+    return cache
+  directory = cache or os.environ.get("RIST_CACHE_DIR")
+  if not directory:
+    return None
+  directory = os.path.abspath(directory)
+  with _caches_lock:
+    if directory not in _caches:
+      _caches[directory] = CompileCache(directory)
+    return _caches[directory]
+
+def default_cache_dir() -> str:
+  directory = os.environ.get("RIST_CACHE_DIR")
+  if directory:
+    return directory
+  base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+  return os.path.join(base, "ristpy")
+
+def compile_cached(
+  code: str,
+  fname: str = "<unknown.rist>",
+  macro_py: Dict[str, List[str]] = None,
+  cache: Optional[CompileCache] = None,
+  optimize: int = 0
+) -> CompiledCode:
+  # Compiles through the cache when there is one, the entry's runner (if it
+  # was stored already) comes along in _code_object
+  macro_py = macro_py or {}
+  if cache is None:
+    with phase("translate"):
+      compiled = get_compiler().compile(code, fname, macro_py, optimize)
+    count_source(code, fname, macro_py)
+    return compiled
+
+  digest = macro_py.digest if isinstance(macro_py, SnippetRegistry) else snippets_digest(macro_py)
+  key = cache.key(code, fname, digest, mode="runner:optimized" if optimize > 0 else "runner")
+  with phase("cache"):
+    entry = cache.load(key)
+  if entry is None:
+    with phase("translate"):
+      compiled = get_compiler().compile(code, fname, macro_py, optimize)
+    count_source(code, fname, macro_py)
+    with phase("cache"):
+      cache.store(key, str(compiled))
+  else:
+    compiled = CompiledCode.setup(entry[0], fname)
+    compiled._code_object = entry[1]
+  compiled._cache, compiled._cache_key = cache, key
+  return compiled
+
+def compile_encrypted(
+  ciphertext: Union[str, bytes],
+  key: int,
+  depth: int = 1,
+  fname: str = "<unknown.rist>",
+  macro_py: Dict[str, List[str]] = None,
+  cache: Optional[CompileCache] = None
+) -> CompiledCode:
+  # Decrypts and compiles in memory. The cache keeps only the runner, keyed by
+  # the ciphertext with the key, neither the plaintext nor its translation.
+  # A hit gives an empty CompiledCode which runs through its _code_object.
+  macro_py = macro_py or {}
+  if cache is not None:
+    data = ciphertext.encode() if isinstance(ciphertext, str) else ciphertext
+    digest = macro_py.digest if isinstance(macro_py, SnippetRegistry) else snippets_digest(macro_py)
+    entry_key = cache.key(data, fname, digest, mode=f"encrypted:{depth}:{key}")
+    with phase("cache"):
+      entry = cache.load(entry_key)
+    if entry is not None and entry[1] is not None:
+      compiled = CompiledCode.setup("", fname)
+      compiled._code_object = entry[1]
+      return compiled
+
+  with phase("decrypt"):
+    source = decrypt(ciphertext, key, depth=depth)
+  if isinstance(source, bytes):
+    source = source.decode()
+  with phase("translate"):
+    compiled = get_compiler().compile(source, fname, macro_py)
+  count_source(source, fname, macro_py)
+  compiled._code_object = compile_runner(str(compiled), fname)
+  if cache is not None:
+    with phase("cache"):
+      cache.store(entry_key, "", compiled._code_object)
+  return compiled
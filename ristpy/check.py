@@ -0,0 +1,86 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Mapping
+
+from .compiler import get_compiler
+from .document import Document
+from .snippets import SnippetRegistry
+
+
+__all__ = ("check_source", "check_file", "check_paths", "find_sources", "as_dict")
+
+
+def check_source(source: str, fname: str = "<unknown.rist>", macro_py: Mapping[str, List[str]] = None) -> List[SyntaxError]:
+  # Every error of a source, in order. Most sources have none, they are
+  # lexed once as a whole without being translated. Only those with errors
+  # go through a Document, which goes on after each one.
+  try:
+    get_compiler().check(source, fname, macro_py or {})
+  except (SyntaxError, AssertionError):
+    errors = Document(source, fname, macro_py).diagnostics()
+    errors.sort(key=lambda e: (e.lineno or 0, e.offset or 0))
+    return errors
+  return []
+
+def check_file(path: str, macro_py: Mapping[str, List[str]] = None) -> List[SyntaxError]:
+  with open(path, "r") as f:
+    return check_source(f.read(), path, macro_py)
+
+def find_sources(paths: Iterable[str]) -> List[str]:
+  # Files as they are, directories searched for rist files
+  found = []
+  for path in paths:
+    if not os.path.isdir(path):
+      found.append(path)
+      continue
+    for root, dirs, files in os.walk(path):
+      dirs.sort()
+      found.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".rist"))
+  return found
+
+
+_worker_snippets = None
+
+def _init_worker(macro_py: SnippetRegistry) -> None:
+  global _worker_snippets
+  _worker_snippets = macro_py
+
+def _check_worker(path: str) -> List[SyntaxError]:
+  try:
+    return check_file(path, _worker_snippets)
+  except (OSError, UnicodeDecodeError) as e:
+    return [_unreadable(path, e)]
+
+def _unreadable(path: str, error: Exception) -> SyntaxError:
+  return SyntaxError(f"Could not read the file ({error})", (path, None, None, None))
+
+
+def check_paths(
+  paths: Iterable[str],
+  workers: int = None,
+  macros: Dict[str, str] = None,
+  macros_py: Dict[str, List[str]] = None
+) -> Dict[str, List[SyntaxError]]:
+  # Errors of every file, across ``workers`` processes (every cpu by default)
+  paths = list(paths)
+  if macros or (macros_py and not isinstance(macros_py, SnippetRegistry)):
+    macros_py = SnippetRegistry(macros, macros_py)
+  macros_py = macros_py or {}
+  workers = min(workers or os.cpu_count() or 1, len(paths))
+  if workers <= 1:
+    _init_worker(macros_py)
+    results = map(_check_worker, paths)
+  else:
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(macros_py,)) as pool:
+      results = list(pool.map(_check_worker, paths, chunksize=max(1, len(paths) // (workers * 4))))
+  return dict(zip(paths, results))
+
+def as_dict(error: SyntaxError) -> dict:
+  return {
+    "file": error.filename,
+    "line": error.lineno,
+    "column": error.offset,
+    "end_column": getattr(error, "end_offset", None),
+    "message": error.msg,
+  }
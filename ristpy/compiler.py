@@ -0,0 +1,612 @@
+import re
+import sys
+import bisect
+import threading
+
+from array import array
+from collections import OrderedDict
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+
+
+__all__ = ("Token", "TokenTable", "LineMap", "CompiledCode", "Compiler", "Translator", "get_compiler", "hoist_predefs")
+
+
+class Token:
+  __slots__ = ("name", "value", "line", "coloumn")
+
+  def __init__(self, name: str, value: str, line: int, coloumn: int) -> None:
+    self.name = name
+    self.value = value
+    self.line = line
+    self.coloumn = coloumn
+
+  def __repr__(self) -> str:
+    return "<Token name='{0.name}' value='{0.value}' line={0.line} coloumn={0.coloumn}>".format(
+      self
+    )
+
+  def __str__(self) -> str:
+    return self.value
+
+
+class TokenTable:
+  # Tokens are kept as parallel columns, a Token is only built when indexed
+  __slots__ = ("source", "names", "kinds", "starts", "ends", "lines")
+
+  def __init__(self, names: Tuple[str, ...]) -> None:
+    self.source = ""
+    self.names = names
+    self.kinds = array("B")
+    self.starts = array("I")
+    self.ends = array("I")
+    self.lines = array("I")
+
+  def append(self, kind: int, start: int, end: int, line: int) -> None:
+    self.kinds.append(kind)
+    self.starts.append(start)
+    self.ends.append(end)
+    self.lines.append(line)
+
+  def __len__(self) -> int:
+    return len(self.kinds)
+
+  def __getitem__(self, index: int) -> Token:
+    start = self.starts[index]
+    return Token(
+      self.names[self.kinds[index]],
+      self.source[start:self.ends[index]],
+      self.lines[index],
+      start - self.source.rfind("\n", 0, start)
+    )
+
+  def __iter__(self):
+    for index in range(len(self.kinds)):
+      yield self[index]
+
+
+class LineMap:
+  # Maps lines of the generated python back to the rist source. Only snippet
+  # expansions move lines, so only those are recorded, as
+  # ``(first generated line, source line, generated lines, snippet name)``.
+  __slots__ = ("fname", "lines", "expansions", "starts", "shifts", "snippets")
+
+  def __init__(
+    self,
+    fname: str,
+    lines: int,
+    expansions: List[Tuple[int, int, int, str]] = (),
+    snippets: Dict[str, "LineMap"] = None
+  ) -> None:
+    self.fname = fname
+    self.lines = lines
+    self.expansions = list(expansions)
+    self.starts = [start for start, _, _, _ in self.expansions]
+    # Lines added by the expansions up to and including each one
+    self.shifts = []
+    shift = 0
+    for _, _, count, _ in self.expansions:
+      shift += count - 1
+      self.shifts.append(shift)
+    # Line maps of the rist snippets, their lines map into their own source
+    self.snippets = snippets or {}
+
+  def lookup(self, line: int) -> Optional[Tuple[str, int]]:
+    # ``(filename, line)`` of a generated line, None when it is not one
+    i = bisect.bisect_right(self.starts, line) - 1
+    shift = 0
+    if i >= 0:
+      start, _, count, name = self.expansions[i]
+      if line < start + count:
+        inner = line - start + 1
+        if name in self.snippets:
+          return self.snippets[name].lookup(inner)
+        return f"<macro_{name}>", inner
+      shift = self.shifts[i]
+    line -= shift
+    if not 0 < line <= self.lines:
+      return None
+    return self.fname, line
+
+
+class CompiledCode(str):
+  # Set when the code went through a CompileCache
+  _cache = None
+  _cache_key = None
+  # The runner, compiled on the first execute() or loaded from the cache
+  _code_object = None
+  # The async runner, compiled on the first execute_async()
+  _async_code_object = None
+  # Set by Compiler.compile(), not kept in the cache
+  line_map = None
+
+  @classmethod
+  def setup(cls, code: str, fname: str = '<unknown>') -> "CompiledCode":
+    self=cls(code)
+    self.file = fname
+    return self
+
+  def __repr__(self) -> str:
+    return str(self)
+
+  @property
+  def code(self) -> str:
+    return str(self)
+
+
+def _syntax_error(msg: str, filename: str, lineno: int, offset: int, text: str, end_offset: int = None) -> SyntaxError:
+  # The location goes in the args, so it is kept when the error is pickled
+  if end_offset is not None and sys.version_info >= (3, 10):
+    return SyntaxError(msg, (filename, lineno, offset, text, lineno, end_offset))
+  return SyntaxError(msg, (filename, lineno, offset, text))
+
+
+_PREDEFS: Dict[str, str] = {
+  'i': "int", 'p': "print", 'd': "dict", 'l': "list", 't': "type", 'n': "input",
+  'm': "__import__", 's': "str", 'u': "tuple", "wh": "while",
+  "o": "locals", "g": "globals",
+  "r": "__import__('ristpy').rist",
+  "eval": "(lambda code:__import__('ristpy').execute(code,[2]))",
+  "e": "else", "ei": "elif", "la": "lambda",
+  "x": "(lambda a,b:((not (a and b)) and (a or b)))",
+  "y": "try", "fi": "finally", "ex": "except",
+  "b": "break", "f": "for", "re": "__import__('re')", "ret": "return",
+  "co": "continue", "yi": "yield", "pa": "pass",
+}
+
+# Predefs which build something on every use, an optimized translation
+# uses ``_rist_<name>`` instead, defined once by the runner's prelude or, in
+# written files, by hoist_predefs()
+_HOISTED: Dict[str, str] = {name: f"_rist_{name}" for name in ("re", "x", "eval")}
+_HOISTED_NAMES = re.compile(r"\b(?:" + "|".join(_HOISTED.values()) + r")\b")
+
+
+_CAPTURING = re.compile(r"(?<!\\)\((?!\?)")
+_NC_MARKER = "//:Rist://NC"
+_NC_LINE = re.compile(r"^.*//:Rist://NC$", re.MULTILINE)
+
+# Tokens which are written out exactly as they were read
+_VERBATIM = frozenset((
+  "WORD", "BLANK", "PUNCT", "NAME", "SPACE", "ATTRIBUTED_NAME", "OPERATOR", "NUMBER", "STRING", "COMMENT",
+  "ASSIGN", "COMMA", "COLON", "SEMICOLON", "TABSPACE", "AT", "PYTHINGS",
+))
+# Bracket stack entries are ``offset << 2 | closer``, closer indexing _CLOSERS
+_CLOSERS = ")]}"
+_OPENING = {"LPAREN": 0, "LBRACK": 1, "LCBRACK": 2}
+_CLOSING = {"RPAREN": 0, "RBRACK": 1, "RCBRACK": 2}
+_PAIRS = {"(": 0, "[": 1, "{": 2}
+_SWAPPED = {"LPAREN": "{", "RPAREN": "}", "LCBRACK": "(", "RCBRACK": ")"}
+
+
+# The rule regexes are compiled once per instance, use get_compiler()
+# to share a single instance across the process.
+class Compiler:
+  # Verbatim shortcuts tried before the ordered rules, none of them can match
+  # where one of the rules below would match something else.
+  fast_rules: List[Tuple[str, str]] = [
+    ('NEWLINE', '\n'),
+    ('WORD', r'[a-zA-Z_][a-zA-Z0-9_]*(?![a-zA-Z0-9_\$])'),
+    ('BLANK', r'(?<=[^\n])[ \t]+'),
+    ('PUNCT', r'[,:;=*/<>!|&~^\\-]+'),
+  ]
+
+  # Rules are matched against the whole source at once, so whitespace inside
+  # a rule must never run over a newline.
+  rules: List[Tuple[str, str]] = [
+    ('COMMENT', r'#.*'),
+    ('DOCSTRING', r'"""'),
+    ('DOCSTRING', r"'''"),
+    ('STRING', r'((".*?")(?<!(\\)))'),
+    ('STRING', r"(('.*?')(?<!(\\)))"),
+    ('MACRO', r"^([^\S\n])*\%\-([^\S\n])*{NAME}([^\S\n])*\-\%([^\S\n])*$"),
+    ('FROM', r'^([^\S\n])*\+@([^\S\n]*)([.]?{ATTRIBUTED_NAME}|{NAME})([^\S\n]*)@\+([^\S\n]*)({ATTRIBUTED_NAME}|\*|\{)'),
+    ('IMPORT', r'^([^\S\n])*@\+([^\S\n]*){ATTRIBUTED_NAME}'),
+    ('ERR_IMPORT', r'\+@ ({ATTRIBUTED_NAME}|{NAME}) @\+ ({ATTRIBUTED_NAME}|\*|\{)'),
+    ('ERR_IMPORT', r'@\+ {ATTRIBUTED_NAME}'),
+    ('FUNCDEF', r'(\$)?{NAME}\$\{'),
+    ('PREDEFS', r'\$(ret|re|co|yi|pa|b|i|p|d|t|n|m|s|u|o|g|r|eval|ei|la|y|fi|ex|e|l|x|f|wh)'),
+    ('AT', '@{ATTRIBUTED_NAME}'),
+    ('ARROW', r'\}( )?\-\>( )?{ATTRIBUTED_NAME}?'),
+    ('AWAIT', r'\?([^\S\n]+)?'),
+    ('NUMBER', r'\d+\.\d+'),
+    ('NUMBER', r'\d+'),
+    ('ATTRIBUTED_NAME', r'{NAME}?([.]*(?=[a-zA-Z_])([a-zA-Z0-9_]*))+'),
+    ('NAME', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+    ('TABSPACE', '\t'),
+    ('SPACE', ' '),
+    ('OPERATOR', r'[\+\*\-\/%]'),       # arithmetic operators
+    ('OPERATOR', r'==|!=|\<|\>'),             # comparison operators
+    ('OPERATOR', r'\|\||\||&|&&'),      # boolean operators
+    ('OPERATOR', r'\.\.\.|\.\.'),       # range operators
+    ('OPERATOR', r'!'),
+    ('ASSIGN', '='),
+    ('LPAREN', r'\('),
+    ('RPAREN', r'\)'),
+    ('LBRACK', r'\['),
+    ('RBRACK', r'\]'),
+    ('LCBRACK', '{'),
+    ('RCBRACK', '}'),
+    ('COLON', r'\:'),
+    ('SEMICOLON', r'\;'),
+    ('COMMA', ','),
+    ("PYTHINGS",r"(\\|\~|\^)"),
+  ]
+
+  def __init__(self) -> None:
+    self.regex = re.compile('|'.join(self.__convert_rules(self.fast_rules + self.rules)), re.MULTILINE)
+    self.kinds = tuple(self.regex.groupindex) + ("lInE",)
+    self.kind_ids = {kind: i for i, kind in enumerate(self.kinds)}
+
+  @staticmethod
+  def __convert_rules(rules: List[Tuple[str, str]]) -> Generator[str, None, None]:
+    grouped_rules = OrderedDict()
+    for name, pattern in rules:
+      grouped_rules.setdefault(name, [])
+      # Only the named group of a rule is ever looked at
+      grouped_rules[name].append(_CAPTURING.sub("(?:", pattern))
+
+    for name, patterns in iter(grouped_rules.items()):
+      ptrn = '|'.join(['(?:{})'.format(p) for p in patterns])
+      for pname, ptrns in iter(grouped_rules.items()):
+        while "{"+pname+"}" in ptrn:
+          ptrn = ptrn.replace("{"+pname+"}", '|'.join(['(?:{ptrn})'.format(ptrn=p) for p in ptrns]))
+      grouped_rules[name] = [ptrn]
+
+    for name, patterns in iter(grouped_rules.items()):
+      joined_patterns = '|'.join(['(?:{ptrn})'.format(ptrn=p) for p in patterns])
+      yield '(?P<{}>{})'.format(name, joined_patterns)
+
+  def compile(
+    self,
+    code: str,
+    fname: str = "<unknown.rist>",
+    macro_py: Dict[str, List[str]] = None,
+    optimize: int = 0
+  ) -> CompiledCode:
+    # ``optimize`` 1 and above uses the hoisted predefs, see _HOISTED
+    python, translator = self._translate(code, fname, macro_py or {}, optimize=optimize)
+    compiled = CompiledCode.setup(python, fname)
+    compiled.line_map = translator.line_map()
+    return compiled
+
+  def tokenize(self, code: str, fname: str = "<unknown.rist>", macro_py: Dict[str, List[str]] = None) -> TokenTable:
+    tokens = TokenTable(self.kinds)
+    self.translate(code, fname, macro_py, tokens)
+    return tokens
+
+  def translate(
+    self,
+    code: str,
+    fname: str = "<unknown.rist>",
+    macro_py: Dict[str, List[str]] = None,
+    tokens: TokenTable = None
+  ) -> str:
+    return self._translate(code, fname, macro_py, tokens)[0]
+
+  def check(self, code: str, fname: str = "<unknown.rist>", macro_py: Dict[str, List[str]] = None) -> None:
+    # Raises the first error of ``code`` like translate() does, without
+    # writing the translation
+    translator = Translator(self, fname, macro_py, lex_only=True)
+    lines = [line.rstrip() for line in code.splitlines()]
+    if lines:
+      translator.feed(lines)
+      translator.close()
+
+  def _translate(self, code, fname, macro_py, tokens=None, optimize=0):
+    translator = Translator(self, fname, macro_py, tokens, optimize)
+    lines = [line.rstrip() for line in code.splitlines()]
+    if not lines:
+      return "", translator
+    python = translator.feed(lines)
+    translator.close()
+    return python, translator
+
+  def translate_stream(
+    self,
+    lines: Iterable[str],
+    fname: str = "<unknown.rist>",
+    macro_py: Dict[str, List[str]] = None,
+    chunk_lines: int = 1024
+  ) -> Generator[str, None, None]:
+    # Translates ``chunk_lines`` lines at a time, the output of a chunk is
+    # yielded before the next one is read
+    translator = Translator(self, fname, macro_py)
+    chunk = []
+    for line in lines:
+      chunk.extend(part.rstrip() for part in line.splitlines() or ("",))
+      if len(chunk) >= chunk_lines:
+        yield translator.feed(chunk)
+        chunk = []
+    if chunk:
+      yield translator.feed(chunk)
+    translator.close()
+
+
+class Translator:
+  # State of a translation carried from one chunk of lines to the next: the
+  # open brackets, an unclosed docstring and where the chunk starts. Tokens
+  # are only recorded when the whole source is fed at once.
+  __slots__ = (
+    "compiler", "fname", "macro_py", "expand", "tokens",
+    "brackets", "openers", "lineno", "offset", "docstring", "last_line", "expansions",
+    "optimize", "lex_only",
+  )
+
+  def __init__(
+    self,
+    compiler: Compiler,
+    fname: str = "<unknown.rist>",
+    macro_py: Dict[str, List[str]] = None,
+    tokens: TokenTable = None,
+    optimize: int = 0,
+    lex_only: bool = False
+  ) -> None:
+    self.compiler = compiler
+    self.fname = fname
+    self.macro_py = macro_py or {}
+    # A SnippetRegistry keeps its expansions joined per indent
+    self.expand = getattr(self.macro_py, "expand", None)
+    self.tokens = tokens
+    # Entries are ``offset << 2 | closer``, offsets counted from the start of
+    # the source. Openers of earlier chunks keep their location in ``openers``.
+    self.brackets = array("q")
+    self.openers: Dict[int, Tuple[int, int, str]] = {}
+    self.lineno = 1
+    self.offset = 0
+    self.docstring = None
+    self.last_line = ""
+    # ``(source line, snippet name, generated lines)`` of every snippet used
+    self.expansions: List[Tuple[int, str, int]] = []
+    self.optimize = optimize > 0
+    # Only lexes and checks, feed() writes nothing and gives ""
+    self.lex_only = lex_only
+
+  def feed(self, lines: List[str]) -> str:
+    # Lexes, checks brackets and translates in one pass over the lines, which
+    # must be right-stripped. Untranslated tokens are never copied one by one,
+    # the output only receives the slices in between the rewritten tokens.
+    s = "\n".join(lines) + "\n"
+    end_of_source = len(s)
+    nc_lines = {m.start() for m in _NC_LINE.finditer(s)} if _NC_MARKER in s else ()
+    fname = self.fname
+    macro_py = self.macro_py
+    expand = self.expand
+    optimize = self.optimize
+    lex_only = self.lex_only
+    tokens = self.tokens
+    if tokens is not None:
+      tokens.source = s
+      add_token = tokens.append
+      kind_ids = self.compiler.kind_ids
+
+    out = []
+    write = out.append
+    brackets = self.brackets
+    push = brackets.append
+    base = self.offset
+    first_line = lineno = self.lineno
+    copied = pos = 0
+    finditer = self.compiler.regex.finditer
+    self.last_line = lines[-1]
+
+    def error(msg, offset, end_offset=None):
+      line = s.count("\n", 0, offset)
+      column = offset - s.rfind("\n", 0, offset)
+      if end_offset is not None:
+        end_offset = column + end_offset - offset
+      return _syntax_error(msg, fname, first_line + line, column, lines[line], end_offset)
+
+    def unmatched(closer, offset):
+      if not brackets:
+        return error(f"Unmatched '{closer}'", offset)
+      return error(f"Got '{closer}', while expecting '{_CLOSERS[brackets[-1] & 3]}'", offset)
+
+    if self.docstring is not None:
+      # Still inside a docstring opened in an earlier chunk
+      close = s.find(self.docstring)
+      if close == -1:
+        self.lineno += len(lines)
+        self.offset += end_of_source
+        return s
+      self.docstring = None
+      pos = close + 3
+      lineno += s.count("\n", 0, close)
+
+    while pos < end_of_source:
+      if pos in nc_lines:
+        # Line is kept as it is, apart from the marker
+        eol = s.index("\n", pos)
+        for i in range(pos, eol - 12):
+          c = s[i]
+          if c in _PAIRS:
+            push((base + i) << 2 | _PAIRS[c])
+          elif c in _CLOSERS:
+            if not brackets or _CLOSERS[brackets[-1] & 3] != c:
+              raise unmatched(c, i)
+            brackets.pop()
+        if tokens is not None:
+          add_token(kind_ids["lInE"], pos, eol - 12, lineno)
+        if not lex_only:
+          write(s[copied:eol - 12])
+          copied = eol
+        pos = eol + 1
+        lineno += 1
+        continue
+
+      for m in finditer(s, pos):
+        start, end = m.span()
+        if start != pos:
+          raise error(f"Unexpected Character '{s[pos]}' in Identifier", pos)
+        pos = end
+        kind = m.lastgroup
+        if tokens is not None and kind != "DOCSTRING":
+          add_token(kind_ids[kind], start, end, lineno)
+        if kind in _VERBATIM:
+          continue
+
+        if kind == "NEWLINE":
+          lineno += 1
+          if pos in nc_lines:
+            break
+          continue
+        elif kind in _OPENING:
+          push((base + start) << 2 | _OPENING[kind])
+          if kind == "LBRACK":
+            continue
+          rep = _SWAPPED[kind]
+        elif kind in _CLOSING:
+          closer = _CLOSING[kind]
+          if not brackets or brackets[-1] & 3 != closer:
+            raise unmatched(_CLOSERS[closer], start)
+          brackets.pop()
+          if kind == "RBRACK":
+            continue
+          rep = _SWAPPED[kind]
+        elif kind == "PREDEFS":
+          name = m.group()[1:]
+          if optimize and name in _HOISTED:
+            rep = _HOISTED[name]
+          else:
+            rep = _PREDEFS[name]
+        elif kind == "FUNCDEF":
+          value = m.group()
+          push((base + end - 1) << 2 | 2)
+          rep = ("async def "+value[1:] if value[0] == "$" else "def "+value).replace("${","(")
+        elif kind == "AWAIT":
+          rep = "await "
+        elif kind == "ARROW":
+          if not brackets or brackets[-1] & 3 != 2:
+            raise unmatched("}", start)
+          brackets.pop()
+          rep = ")"+m.group()[1:]
+        elif kind == "IMPORT":
+          rep = m.group().replace("@+","import")
+        elif kind == "FROM":
+          value = m.group()
+          if value[-1] == "{":
+            push((base + end - 1) << 2 | 2)
+          rep = value.replace("+@","from").replace("@+","import").replace("{","(")
+        elif kind == "MACRO":
+          indent, n = m.group().split("%-")
+          n = n.split("-%")[0].strip()
+          assert n in macro_py, f"Snippet '{n}' not found!"
+          if lex_only:
+            continue
+          rep = expand(n, indent) if expand else indent + f"\n{indent}".join(macro_py[n])
+          self.expansions.append((lineno, n, len(macro_py[n]) or 1))
+        elif kind == "DOCSTRING":
+          # Docstrings are copied as they are, up to the closing quotes
+          close = s.find(m.group(), end)
+          if close == -1:
+            # Closed in a later chunk, or close() reports it
+            self.docstring = m.group()
+            lineno += s.count("\n", end)
+            pos = end_of_source
+            break
+          pos = close + 3
+          if tokens is not None:
+            add_token(kind_ids[kind], start, pos, lineno)
+          lineno += s.count("\n", end, close)
+          break
+        else:
+          raise error("Unexpected position of 'IMPORT' syntax, it should not come after any text", start, end)
+
+        if not lex_only:
+          write(s[copied:start])
+          write(rep)
+          copied = end
+      else:
+        if pos < end_of_source:
+          raise error(f"Unexpected Character '{s[pos]}' in Identifier", pos)
+
+    # Locations of the brackets left open, for reporting them at the end
+    openers = {}
+    for entry in brackets:
+      offset = entry >> 2
+      if offset < base:
+        openers[offset] = self.openers[offset]
+      else:
+        offset -= base
+        line = s.count("\n", 0, offset)
+        openers[entry >> 2] = (first_line + line, offset - s.rfind("\n", 0, offset), lines[line])
+    self.openers = openers
+    self.lineno = lineno
+    self.offset += end_of_source
+
+    if lex_only:
+      return ""
+    write(s[copied:])
+    return "".join(out)
+
+  def line_map(self) -> LineMap:
+    expansions = []
+    shift = 0
+    for line, name, count in self.expansions:
+      expansions.append((line + shift, line, count, name))
+      shift += count - 1
+    maps = getattr(self.macro_py, "line_maps", {})
+    snippets = {name: maps[name] for _, name, _ in self.expansions if name in maps}
+    return LineMap(self.fname, self.lineno - 1, expansions, snippets)
+
+  def close(self) -> None:
+    # Raises for what was left open at the end of the source
+    if self.docstring is not None:
+      raise _syntax_error("EOF while scanning docstring literal", self.fname, self.lineno - 1, len(self.last_line), self.last_line)
+    if self.brackets:
+      raise _syntax_error("Unexpected EOF", self.fname, *self.openers[self.brackets[-1] >> 2])
+
+
+def hoist_predefs(python: str) -> str:
+  # An optimized translation which runs on its own, for writing it out. The
+  # hoisted predefs it uses are defined on a line of their own, after the
+  # docstring and __future__ imports, so the lines after it move down one.
+  used = set(_HOISTED_NAMES.findall(python))
+  definitions = [f"{hoisted} = {_PREDEFS[name]}" for name, hoisted in _HOISTED.items() if hoisted in used]
+  if not definitions:
+    return python
+  header = "; ".join(definitions) + "\n"
+  after = _prologue_lines(python)
+  split = 0
+  for _ in range(after):
+    split = python.index("\n", split) + 1
+  return python[:split] + header + python[split:]
+
+def _prologue_lines(python: str) -> int:
+  # Lines taken by the docstring and __future__ imports starting ``python``,
+  # the rest of it is never tokenized
+  import io
+  import tokenize
+
+  end = 0
+  statement = []
+  try:
+    for token in tokenize.generate_tokens(io.StringIO(python).readline):
+      kind = token.type
+      if kind in (tokenize.COMMENT, tokenize.NL):
+        continue
+      if kind != tokenize.NEWLINE:
+        if kind in (tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER):
+          break
+        statement.append(token)
+        continue
+      docstring = not end and all(t.type == tokenize.STRING for t in statement)
+      future = [t.string for t in statement[:2]] == ["from", "__future__"]
+      if not (docstring or future):
+        break
+      end = token.end[0]
+      statement = []
+  except (tokenize.TokenError, SyntaxError):
+    # Left for compile() to report
+    pass
+  return end
+
+
+_compiler = None
+_compiler_lock = threading.Lock()
+
+def get_compiler() -> Compiler:
+  global _compiler
+  if _compiler is None:
+    with _compiler_lock:
+      if _compiler is None:
+        _compiler = Compiler()
+  return _compiler
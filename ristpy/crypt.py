@@ -0,0 +1,252 @@
+import os
+import base64
+import random
+import tempfile
+
+from typing import IO, Iterator, Tuple, Union
+
+
+__all__ = ("encrypt", "decrypt", "encrypt_stream", "decrypt_stream", "armor", "is_encrypted")
+
+
+# Binary format, version 1:
+#   header  MAGIC, version, depth, flags, lane width  (12 bytes)
+#   chunks  count (4 bytes, little endian), count lanes of ``width`` bytes
+#
+# Every byte ``x`` of the (utf-8) input becomes ``x * key + key``, ``depth``
+# times over, like the text format did with every character. The layers are
+# applied at once, ``x * key**depth + key + ... + key**depth``, to a whole
+# chunk held in one int with a lane per byte, wide enough that no lane ever
+# carries into the next.
+MAGIC = b"RIST\x00ENC"
+VERSION = 1
+_TEXT = 1
+_HEADER = len(MAGIC) + 4
+_COUNT = 4
+# Prefix of the base64 form, for places which need text
+ARMOR = "RISTENC:"
+CHUNK_SIZE = 1 << 20
+
+
+def _factors(key: int, depth: int) -> Tuple[int, int]:
+  if not isinstance(key, int) or key < 1:
+    raise ValueError("Key should be a positive integer")
+  if depth < 1 or depth > 8:
+    raise ValueError("Depth should neither be less than 1, nor more than 8")
+  return key ** depth, sum(key ** i for i in range(1, depth + 1))
+
+def _width(key: int, depth: int) -> int:
+  scale, shift = _factors(key, depth)
+  return max(1, (255 * scale + shift).bit_length() + 7 >> 3)
+
+def _ones(count: int, width: int) -> int:
+  # 1 in every lane
+  return int.from_bytes((b"\x01" + bytes(width - 1)) * count, "little")
+
+def _encrypt_chunk(data: bytes, scale: int, shift: int, width: int) -> bytes:
+  if width == 1:
+    lanes = data
+  else:
+    lanes = bytearray(len(data) * width)
+    lanes[::width] = data
+  value = int.from_bytes(lanes, "little") * scale + shift * _ones(len(data), width)
+  return len(data).to_bytes(_COUNT, "little") + value.to_bytes(len(data) * width, "little")
+
+def _decrypt_chunk(lanes: bytes, count: int, scale: int, shift: int, width: int) -> bytes:
+  value, rest = divmod(int.from_bytes(lanes, "little") - shift * _ones(count, width), scale)
+  try:
+    if rest or value < 0:
+      raise OverflowError
+    data = value.to_bytes(count * width, "little")
+  except OverflowError:
+    raise ValueError("Wrong key or depth") from None
+  if width == 1:
+    return data
+  for i in range(1, width):
+    if data[i::width].count(0) != count:
+      raise ValueError("Wrong key or depth")
+  return data[::width]
+
+
+def _header(depth: int, text: bool, width: int) -> bytes:
+  return MAGIC + bytes((VERSION, depth, _TEXT if text else 0, width))
+
+def _read_header(header: bytes, depth: int) -> Tuple[bool, int]:
+  header = bytes(header)
+  if len(header) < _HEADER or not header.startswith(MAGIC):
+    raise ValueError("Not encrypted by rist")
+  version, stored_depth, flags, width = header[len(MAGIC):_HEADER]
+  if version != VERSION:
+    raise ValueError(f"Unsupported encryption format version {version}")
+  if stored_depth != depth:
+    raise ValueError("Wrong key or depth")
+  return bool(flags & _TEXT), width
+
+def _encrypt_chunks(chunks: Iterator[bytes], key: int, depth: int, text: bool) -> Iterator[bytes]:
+  scale, shift = _factors(key, depth)
+  width = _width(key, depth)
+  yield _header(depth, text, width)
+  for chunk in chunks:
+    if chunk:
+      yield _encrypt_chunk(chunk, scale, shift, width)
+
+def _decrypt_chunks(read, key: int, depth: int) -> Iterator[Union[bool, bytes]]:
+  # Yields whether the input was text, then the decrypted chunks
+  text, width = _read_header(read(_HEADER), depth)
+  scale, shift = _factors(key, depth)
+  if width != _width(key, depth):
+    raise ValueError("Wrong key or depth")
+  yield text
+  while True:
+    count = read(_COUNT)
+    if not count:
+      return
+    count = int.from_bytes(count, "little")
+    lanes = read(count * width)
+    if len(lanes) != count * width:
+      raise ValueError("Encrypted data is truncated")
+    yield _decrypt_chunk(lanes, count, scale, shift, width)
+
+
+def is_encrypted(data: Union[str, bytes]) -> bool:
+  # Whether ``data`` is in the binary format, or its armored text form
+  if isinstance(data, str):
+    return data.startswith(ARMOR)
+  return data.startswith(MAGIC)
+
+def armor(data: bytes) -> str:
+  return ARMOR + base64.b64encode(data).decode()
+
+def _chunked(data: bytes, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+  for i in range(0, len(data), size):
+    yield data[i:i + size]
+
+
+def encrypt(code: Union[str, bytes], key: int = None, *, depth: int = 1, legacy: bool = False):
+  # Returns the encrypted bytes, or ``[encrypted, key]`` when no key was given
+  is_key = bool(key)
+  key = key or random.randint(1, 100)
+  if legacy:
+    res = _encrypt_text(code, key, depth)
+  else:
+    text = isinstance(code, str)
+    data = code.encode() if text else bytes(code)
+    res = b"".join(_encrypt_chunks(_chunked(data), key, depth, text))
+  if not is_key: res = [res, key]
+  return res
+
+def decrypt(enc: Union[str, bytes], key: int, *, depth: int = 1) -> Union[str, bytes]:
+  # Takes both formats, text comes back as it was encrypted
+  if isinstance(enc, str) and enc.startswith(ARMOR):
+    enc = base64.b64decode(enc[len(ARMOR):])
+  if isinstance(enc, str):
+    return _decrypt_text(enc, key, depth)
+  if not enc.startswith(MAGIC):
+    return _decrypt_text(enc.decode(), key, depth)
+
+  view = memoryview(enc)
+  pos = 0
+  def read(n):
+    nonlocal pos
+    pos += n
+    return view[pos - n:pos]
+  chunks = _decrypt_chunks(read, key, depth)
+  text = next(chunks)
+  data = b"".join(chunks)
+  return data.decode() if text else data
+
+def encrypt_stream(
+  src: Union[str, IO[bytes]],
+  dst: Union[str, IO[bytes]],
+  key: int,
+  *,
+  depth: int = 1,
+  text: bool = True,
+  chunk_size: int = CHUNK_SIZE
+) -> None:
+  # Encrypts a binary file ``chunk_size`` bytes at a time. ``text`` marks the
+  # content as utf-8, so decrypt() gives back a str.
+  with _Input(src, "rb") as f, _Output(dst) as out:
+    for chunk in _encrypt_chunks(iter(lambda: f.read(chunk_size), b""), key, depth, text):
+      out.write(chunk)
+
+def decrypt_stream(src: Union[str, IO[bytes]], dst: Union[str, IO[bytes]], key: int, *, depth: int = 1) -> None:
+  # Decrypts the binary format a chunk at a time into a binary file
+  with _Input(src, "rb") as f, _Output(dst) as out:
+    chunks = _decrypt_chunks(f.read, key, depth)
+    next(chunks)
+    for chunk in chunks:
+      out.write(chunk)
+
+
+class _Input:
+  # Opens paths, leaves file objects to their owner
+  def __init__(self, file, mode: str) -> None:
+    self.file = file
+    self.mode = mode
+    self.f = None
+
+  def __enter__(self):
+    if isinstance(self.file, str):
+      self.f = open(self.file, self.mode)
+      return self.f
+    return self.file
+
+  def __exit__(self, *exc) -> None:
+    if self.f is not None:
+      self.f.close()
+
+
+class _Output:
+  # A path is written to a temporary file, which replaces it when done
+  def __init__(self, dst) -> None:
+    self.dst = dst
+    self.tmp = None
+
+  def __enter__(self):
+    if not isinstance(self.dst, str):
+      return self.dst
+    fd, self.tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(os.path.abspath(self.dst)))
+    self.f = os.fdopen(fd, "wb")
+    return self.f
+
+  def __exit__(self, exc_type, *exc) -> None:
+    if self.tmp is None:
+      return
+    self.f.close()
+    if exc_type is None:
+      os.chmod(self.tmp, os.stat(self.dst).st_mode & 0o777 if os.path.exists(self.dst) else 0o644)
+      os.replace(self.tmp, self.dst)
+    else:
+      os.remove(self.tmp)
+
+
+# The original text format, characters as ``ord(c) * key + key`` in
+# decimal, separated by spaces, every layer encrypting the text of the last
+def _encrypt_text(code: str, key: int, depth: int) -> str:
+  if depth < 1 or depth > 8:
+    raise ValueError("Depth should neither be less than 1, nor more than 8")
+  assert isinstance(key, int)
+  for _ in range(depth):
+    code = " ".join([str(ord(c) * key + key) for c in code])
+  return code
+
+def _decrypt_text(enc: str, key: int, depth: int) -> str:
+  if depth < 1 or depth > 8:
+    raise ValueError("Depth should neither be less than 1, nor more than 8")
+  for _ in range(depth):
+    parts = enc.split(" ")
+    try:
+      values = list(map(int, parts))
+    except ValueError:
+      # Anything which is not a number is skipped
+      values = [int(i) for i in parts if _is_int(i)]
+    enc = "".join([chr(int((i - key) / key)) for i in values])
+  return enc
+
+def _is_int(s: str) -> bool:
+  try:
+    int(s)
+  except ValueError:
+    return False
+  return True
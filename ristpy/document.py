@@ -0,0 +1,200 @@
+from typing import Dict, List, Optional, Tuple
+
+from .compiler import TokenTable, Translator, get_compiler, _syntax_error
+from .snippets import SnippetRegistry
+
+
+__all__ = ("Document",)
+
+
+class _Line:
+  # A source line with what lexing it gave: its python, tokens (offsets
+  # within the line) and error, and the state at its end. The state is
+  # ``(open docstring quotes, ((closer, line, column), ...))``, the open
+  # brackets naming the _Line they were opened on, so lines can move without
+  # their states changing.
+  #
+  # Lexing a line only looks at the docstring it starts in and the closers of
+  # the brackets it closes, ``pops``, so it holds for any state which agrees
+  # on those. A line with an error depends on all the closers.
+  __slots__ = ("text", "python", "tokens", "error", "docstring", "pops", "pushes", "state")
+
+  def __init__(self, text: str) -> None:
+    self.text = text
+    self.python = ""
+    self.tokens: Optional[TokenTable] = None
+    self.error: Optional[Tuple[str, int, Optional[int]]] = None
+    self.docstring: Optional[str] = None
+    self.pops: Tuple[int, ...] = ()
+    self.pushes: Tuple[Tuple[int, int], ...] = ()
+    self.state = _START
+
+  def carry(self, state: tuple) -> Optional[tuple]:
+    # The state at the end of this line, when it starts with ``state``,
+    # without lexing it again. None when it has to be.
+    docstring, stack = state
+    if docstring != self.docstring:
+      return None
+    if self.error is not None:
+      return state if _closers(stack) == self.pops else None
+    kept = len(stack) - len(self.pops)
+    if kept < 0 or _closers(stack[kept:]) != self.pops:
+      return None
+    return self.state[0], stack[:kept] + tuple((closer, self, column) for closer, column in self.pushes)
+
+
+def _closers(stack: tuple) -> Tuple[int, ...]:
+  return tuple(closer for closer, _, _ in stack)
+
+
+_START = (None, ())
+
+
+class Document:
+  # A rist source kept lexed and translated line by line, for editors. An
+  # edit re-lexes the lines it changed, then the lines after them until the
+  # state at the end of a line is the same as before the edit. Errors do not
+  # stop it, a line with one is kept untranslated and left out of the state.
+  def __init__(self, text: str = "", fname: str = "<unknown.rist>", macro_py: Dict[str, List[str]] = None) -> None:
+    if macro_py and not isinstance(macro_py, SnippetRegistry):
+      macro_py = SnippetRegistry(macros_py=macro_py)
+    self.compiler = get_compiler()
+    self.fname = fname
+    self.macro_py = macro_py or {}
+    self._lines: List[_Line] = []
+    # Lines lexed by the last change
+    self.relexed = 0
+    self.set_text(text)
+
+  def set_text(self, text: str) -> range:
+    return self.replace_lines(0, len(self._lines), text)
+
+  def replace_lines(self, start: int, end: int, text: str) -> range:
+    # Replaces lines ``start`` to ``end`` (0-based, end excluded) with the
+    # lines of ``text``. Returns the new lines whose python or state changed.
+    if not 0 <= start <= end <= len(self._lines):
+      raise IndexError(f"Lines {start} to {end} are not in the document")
+    return self._splice(start, end, text.splitlines())
+
+  def edit(self, start: Tuple[int, int], end: Tuple[int, int], text: str) -> range:
+    # Replaces the text between two ``(line, column)`` positions, 0-based like
+    # in the language server protocol. The line after a final line break is
+    # not kept, so it is one past the last line.
+    (start_line, start_column), (end_line, end_column) = start, end
+    lines = self._lines
+    if not 0 <= start_line <= end_line <= len(lines):
+      raise IndexError(f"Lines {start_line} to {end_line} are not in the document")
+    before = lines[start_line].text[:start_column] if start_line < len(lines) else ""
+    after = lines[end_line].text[end_column:] if end_line < len(lines) else ""
+    # Unlike splitlines(), a line break at the end gives an empty line
+    parts = (before + text + after + "-").splitlines()
+    parts[-1] = parts[-1][:-1]
+    if end_line == len(lines):
+      if parts[-1] == "":
+        parts.pop()
+      return self._splice(start_line, end_line, parts)
+    return self._splice(start_line, end_line + 1, parts)
+
+  def _splice(self, start: int, end: int, parts: List[str]) -> range:
+    lines = self._lines
+    state = lines[start - 1].state if start else _START
+    new = []
+    for part in parts:
+      line = _Line(part)
+      state = self._lex(line, state)
+      new.append(line)
+
+    # Lines after the change are carried on until one ends as it did, only
+    # those which depend on what changed are lexed again
+    relexed = len(new)
+    old_state = lines[end - 1].state if end else _START
+    stop = end
+    while state != old_state and stop < len(lines):
+      line = lines[stop]
+      old_state = line.state
+      carried = line.carry(state)
+      if carried is None:
+        state = self._lex(line, state)
+        relexed += 1
+      else:
+        state = line.state = carried
+      stop += 1
+    lines[start:end] = new
+    self.relexed = relexed
+    return range(start, start + len(new) + stop - end)
+
+  def _lex(self, line: _Line, state: tuple) -> tuple:
+    docstring, stack = state
+    line.docstring = docstring
+    translator = Translator(self.compiler, self.fname, self.macro_py, TokenTable(self.compiler.kinds))
+    translator.docstring = docstring
+    # Brackets of earlier lines come first, as the offsets before this line's
+    translator.offset = len(stack)
+    for i, (closer, _, _) in enumerate(stack):
+      translator.brackets.append(i << 2 | closer)
+      translator.openers[i] = None
+    try:
+      line.python = translator.feed([line.text.rstrip()])
+    except (SyntaxError, AssertionError) as e:
+      # AssertionError is a snippet which does not exist
+      line.python = line.text.rstrip() + "\n"
+      line.tokens = None
+      if isinstance(e, SyntaxError):
+        line.error = (e.msg, e.offset, getattr(e, "end_offset", None))
+      else:
+        line.error = (str(e), 1, None)
+      line.pops, line.pushes = _closers(stack), ()
+      line.state = state
+      return state
+
+    line.tokens = translator.tokens
+    line.error = None
+    # Brackets of earlier lines still open are the first ``kept``
+    kept = 0
+    for entry in translator.brackets:
+      if entry >> 2 >= len(stack):
+        break
+      kept += 1
+    line.pops = _closers(stack[kept:])
+    line.pushes = tuple((entry & 3, translator.openers[entry >> 2][1]) for entry in translator.brackets[kept:])
+    line.state = (translator.docstring, stack[:kept] + tuple((closer, line, column) for closer, column in line.pushes))
+    return line.state
+
+  def __len__(self) -> int:
+    return len(self._lines)
+
+  @property
+  def text(self) -> str:
+    return "\n".join(line.text for line in self._lines)
+
+  @property
+  def python(self) -> str:
+    # The translation, as Compiler.translate() gives it for a source
+    # without errors
+    return "".join(line.python for line in self._lines)
+
+  def line_python(self, index: int) -> str:
+    return self._lines[index].python
+
+  def tokens(self, index: int) -> Optional[TokenTable]:
+    # Tokens of a line, None if it has an error
+    return self._lines[index].tokens
+
+  def diagnostics(self) -> List[SyntaxError]:
+    # Every error, then what was left open at the end
+    errors = []
+    lines = self._lines
+    for index, line in enumerate(lines):
+      if line.error is not None:
+        msg, offset, end_offset = line.error
+        errors.append(_syntax_error(msg, self.fname, index + 1, offset, line.text, end_offset))
+
+    docstring, stack = lines[-1].state if lines else _START
+    if docstring is not None:
+      last = lines[-1].text.rstrip()
+      errors.append(_syntax_error("EOF while scanning docstring literal", self.fname, len(lines), len(last), last))
+    elif stack:
+      _, opener, column = stack[-1]
+      index = lines.index(opener)
+      errors.append(_syntax_error("Unexpected EOF", self.fname, index + 1, column, opener.text.rstrip()))
+    return errors
@@ -0,0 +1,296 @@
+import re
+import ast
+import copy
+import inspect
+import linecache
+
+from types import CodeType
+from typing import Sequence, Union
+
+from .compiler import _HOISTED, _PREDEFS
+from .stats import phase
+from .walkers import KeywordTransformer
+
+
+__all__ = (
+  "Scope", "Sender", "AsyncSender", "CodeExecutor",
+  "parse_python", "compile_runner", "run_compiled", "run_compiled_async",
+)
+
+
+class Scope:
+  __slots__ = ('globals', 'locals')
+
+  def __init__(self, globals_: dict = None, locals_: dict = None):
+    self.globals: dict = globals_ or {}
+    self.locals: dict = locals_ or {}
+
+  def clear_intersection(self, other_dict):
+    for key, value in other_dict.items():
+      if key in self.globals and self.globals[key] is value:
+        del self.globals[key]
+      if key in self.locals and self.locals[key] is value:
+        del self.locals[key]
+    return self
+
+  def update(self, other):
+    self.globals.update(other.globals)
+    self.locals.update(other.locals)
+    return self
+
+  def update_globals(self, other: dict):
+    self.globals.update(other)
+    return self
+
+  def update_locals(self, other: dict):
+    self.locals.update(other)
+    return self
+
+
+_CODE = """
+# indent: 4 spaces
+{2}def _runner_func({0}):
+{1}
+    try:
+        pass
+    finally:
+        _executor.scope.globals.update(locals())
+"""
+
+# What import_expression calls to import, its constants.IMPORTER
+_IMPORTER = "_IMPORT_MODULE"
+# The runner imports what a program uses of these without importing it,
+# asyncio and aiohttp were once given to every program. It also defines the
+# hoisted predefs of optimized translations, after the code's own lines.
+_PRELUDE = {
+  "asyncio": "    import asyncio",
+  "aiohttp": "    import aiohttp",
+  _IMPORTER: f"    from importlib import import_module as {_IMPORTER}",
+  **{hoisted: f"    {hoisted} = {_PREDEFS[name]}" for name, hoisted in _HOISTED.items()},
+}
+_PRELUDE_NAMES = re.compile(r"\b(?:" + "|".join(_PRELUDE) + r")\b")
+
+# Parsed runner templates by argument list, prelude and whether the runner is
+# async, copied before being filled
+_templates = {}
+
+def _template(args: str, prelude: tuple, is_async: bool = False) -> ast.Module:
+  key = (args, prelude, is_async)
+  mod = _templates.get(key)
+  if mod is None:
+    code = _CODE.format(args, "\n".join(_PRELUDE[name] for name in prelude), "async " if is_async else "")
+    mod = _templates[key] = ast.parse(code, "<runner>", 'exec')
+  return copy.deepcopy(mod)
+
+def _prelude(user_code: ast.Module) -> tuple:
+  names = {node.id for node in ast.walk(user_code) if isinstance(node, ast.Name)}
+  return tuple(name for name in _PRELUDE if name in names)
+
+# A "!" which does not start "!=". Python without one can not use import
+# expressions (``name!``), so CPython's parser takes it as it is.
+_IMPORT_OP = re.compile(r"!(?!=)")
+
+def parse_python(code: str, fname: str = "<unknown.rist>") -> ast.Module:
+  # Translated python to a tree with the lines and columns of ``code``
+  if _IMPORT_OP.search(code) is None:
+    return ast.parse(code, fname, 'exec')
+  import import_expression
+  return import_expression.parse(code, fname, mode='exec')
+
+def _wrap_code(code: Union[str, ast.Module], args: str = '', f=None, is_async: bool = False) -> ast.Module:
+  # A tree is used up, its statements move into the runner
+  if isinstance(code, ast.Module):
+    user_code = code
+    last_line = max((node.end_lineno for node in code.body), default=0)
+    prelude = _prelude(code)
+  else:
+    user_code = parse_python(code, f)
+    last_line = code.count("\n") + 1
+    # Only walked for code which may need one
+    if _PRELUDE_NAMES.search(code) or _IMPORT_OP.search(code):
+      prelude = _prelude(user_code)
+    else:
+      prelude = ()
+  mod = _template(args, prelude, is_async)
+  # The runner's own lines go after the code's, so they never share a line
+  ast.increment_lineno(mod, last_line)
+  definition = mod.body[-1]
+  assert isinstance(definition, (ast.FunctionDef, ast.AsyncFunctionDef))
+  try_block = definition.body[-1]
+  assert isinstance(try_block, ast.Try)
+
+  try_block.body.extend(user_code.body)
+  ast.fix_missing_locations(mod)
+  KeywordTransformer().generic_visit(try_block)
+  last_expr = try_block.body[-1]
+
+  if not isinstance(last_expr, ast.Expr):
+    return mod
+
+  if not isinstance(last_expr.value, ast.Yield):
+    yield_stmt = ast.Yield(last_expr.value)
+    ast.copy_location(yield_stmt, last_expr)
+    yield_expr = ast.Expr(yield_stmt)
+    ast.copy_location(yield_expr, last_expr)
+    try_block.body[-1] = yield_expr
+
+  return mod
+
+def compile_runner(
+  code: Union[str, ast.Module],
+  fname: str = "<unknown.rist>",
+  arg_names: Sequence[str] = ("_executor",),
+  is_async: bool = False
+) -> CodeType:
+  # An async runner may await at the top level, it is run by run_compiled_async()
+  with phase("wrap"):
+    mod = _wrap_code(code, args=', '.join(arg_names), f=fname, is_async=is_async)
+  with phase("compile"):
+    return compile(mod, fname, 'exec')
+
+
+class Sender:
+  __slots__ = ('iterator', 'send_value')
+  def __init__(self, iterator):
+    self.iterator = iterator
+    self.send_value = None
+
+  def __iter__(self):
+    return self.__internal(self.iterator.__iter__())
+
+  def __internal(self, base):
+    try:
+      while True:
+        value = base.send(self.send_value)
+        self.send_value = None
+        yield self.set_send_value, value
+    except StopIteration:
+      pass
+
+  def set_send_value(self, value):
+    self.send_value = value
+
+
+class AsyncSender:
+  __slots__ = ('iterator', 'send_value')
+  def __init__(self, iterator):
+    self.iterator = iterator
+    self.send_value = None
+
+  def __aiter__(self):
+    return self.__internal(self.iterator.__aiter__())
+
+  async def __internal(self, base):
+    try:
+      while True:
+        value = await base.asend(self.send_value)
+        self.send_value = None
+        yield self.set_send_value, value
+    except StopAsyncIteration:
+      pass
+
+  def set_send_value(self, value):
+    self.send_value = value
+
+
+class CodeExecutor:
+  __slots__ = ('args', 'arg_names', 'code', 'loop', 'scope', 'source', 'fname')
+
+  def __init__(
+    self,
+    code: str,
+    fname: str = "<unknown.rist>",
+    scope: Scope = None,
+    arg_dict: dict = None,
+    code_object: CodeType = None
+  ):
+    self.args = [self]
+    self.arg_names = ['_executor']
+    self.fname = fname or "<unknown.rist>"
+
+    if arg_dict:
+      for key, value in arg_dict.items():
+        self.arg_names.append(key)
+        self.args.append(value)
+
+    self.source = code
+    self.code = code_object or compile_runner(code, self.fname, self.arg_names)
+    self.scope = scope or Scope()
+
+  def __iter__(self):
+    return self.__traverse(self.__runner())
+
+  def __aiter__(self):
+    # For a runner compiled with is_async
+    return self.__atraverse(self.__runner())
+
+  def __runner(self):
+    exec(self.code, self.scope.globals, self.scope.locals)
+    return self.scope.locals.get('_runner_func') or self.scope.globals['_runner_func']
+
+  def __traverse(self, func):
+    try:
+      if inspect.isgeneratorfunction(func):
+        for send, result in Sender(func(*self.args)):
+          send((yield result))
+      else:
+        yield func(*self.args)
+    except Exception:
+      self.__cache_source()
+      raise
+
+  async def __atraverse(self, func):
+    try:
+      if inspect.isasyncgenfunction(func):
+        async for send, result in AsyncSender(func(*self.args)):
+          send((yield result))
+      else:
+        yield await func(*self.args)
+    except Exception:
+      self.__cache_source()
+      raise
+
+  def __cache_source(self):
+    linecache.cache[self.fname] = (
+      len(self.source),
+      None,
+      [line + '\n' for line in self.source.splitlines()],
+      self.fname
+    )
+
+
+def run_compiled(code, scope: Scope = None):
+  # Runs a CompiledCode, its runner is compiled on the first run and kept
+  # on it (and in its cache). Returns the last value the code produced.
+  code_object = code._code_object
+  if code_object is None:
+    code_object = code._code_object = compile_runner(str(code), code.file)
+    if code._cache is not None:
+      with phase("cache"):
+        code._cache.store(code._cache_key, str(code), code_object)
+
+  last = None
+  with phase("exec"):
+    for send, result in Sender(CodeExecutor(str(code), arg_dict={}, fname=code.file, scope=scope, code_object=code_object)):
+      if result is None:
+        continue
+      send(result)
+      last = result
+  return last
+
+async def run_compiled_async(code, scope: Scope = None):
+  # run_compiled() on the running event loop, the code may await at the top
+  # level. Its async runner is kept on it, not in the cache.
+  code_object = code._async_code_object
+  if code_object is None:
+    code_object = code._async_code_object = compile_runner(str(code), code.file, is_async=True)
+
+  last = None
+  with phase("exec"):
+    executor = CodeExecutor(str(code), arg_dict={}, fname=code.file, scope=scope, code_object=code_object)
+    async for send, result in AsyncSender(executor):
+      if result is None:
+        continue
+      send(result)
+      last = result
+  return last
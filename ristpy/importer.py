@@ -0,0 +1,169 @@
+import os
+import sys
+import importlib.abc
+import importlib.util
+
+from types import CodeType, ModuleType
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import CompileCache, get_cache, default_cache_dir, snippets_digest
+from .compiler import get_compiler
+from .snippets import used_snippets
+from .stats import phase, count_source
+
+
+__all__ = (
+  "RistFinder", "RistLoader",
+  "install", "uninstall", "run_main",
+  "compile_module", "module_key", "used_snippets", "get_import_cache",
+)
+
+
+def module_key(cache: CompileCache, source: str, path: str, macro_py: Dict[str, List[str]]) -> str:
+  # Only the snippets used by the file are part of its key
+  used = {name: macro_py[name] for name in used_snippets(source) if name in macro_py}
+  return cache.key(source, path, snippets_digest(used), mode="module")
+
+def compile_module(
+  path: str,
+  macro_py: Dict[str, List[str]] = None,
+  cache: CompileCache = None
+) -> Tuple[str, CodeType]:
+  macro_py = macro_py or {}
+  with phase("read"):
+    with open(path, "r") as f:
+      source = f.read()
+  if cache is not None:
+    with phase("cache"):
+      key = module_key(cache, source, path, macro_py)
+      entry = cache.load(key)
+    if entry is not None and entry[1] is not None:
+      return entry
+
+  with phase("translate"):
+    python = str(get_compiler().compile(source, path, macro_py))
+  count_source(source, path, macro_py)
+  with phase("compile"):
+    code = compile(python, path, "exec", dont_inherit=True)
+  if cache is not None:
+    with phase("cache"):
+      cache.store(key, python, code)
+  return python, code
+
+
+class RistLoader(importlib.abc.ExecutionLoader):
+  def __init__(
+    self,
+    fullname: str,
+    path: str,
+    macro_py: Dict[str, List[str]] = None,
+    cache: CompileCache = None
+  ) -> None:
+    self.name = fullname
+    self.path = path
+    self.macro_py = macro_py or {}
+    self.cache = cache
+
+  def get_filename(self, fullname: str = None) -> str:
+    return self.path
+
+  def is_package(self, fullname: str = None) -> bool:
+    return os.path.basename(self.path) == "__init__.rist"
+
+  def get_source(self, fullname: str = None) -> str:
+    return self._compile()[0]
+
+  def get_code(self, fullname: str = None) -> CodeType:
+    return self._compile()[1]
+
+  def _compile(self):
+    return compile_module(self.path, self.macro_py, self.cache)
+
+
+class RistFinder(importlib.abc.MetaPathFinder):
+  # Finds ``<name>.rist`` modules and ``<name>/__init__.rist`` packages. When
+  # ``dirs`` is given, only files directly inside those directories are served.
+  def __init__(
+    self,
+    dirs: Iterable[str] = None,
+    ignore: Iterable[str] = (),
+    macro_py: Dict[str, List[str]] = None,
+    cache: CompileCache = None
+  ) -> None:
+    self.dirs = None if dirs is None else {os.path.abspath(d) for d in dirs}
+    self.ignore = {os.path.abspath(f) for f in ignore}
+    self.macro_py = macro_py or {}
+    self.cache = cache
+
+  def find_spec(self, fullname: str, path: Optional[Sequence[str]] = None, target: ModuleType = None):
+    name = fullname.rpartition(".")[2]
+    for entry in (sys.path if path is None else path):
+      entry = os.path.abspath(entry or ".")
+      for filename, is_package in (
+        (os.path.join(entry, name, "__init__.rist"), True),
+        (os.path.join(entry, name + ".rist"), False),
+      ):
+        if not os.path.isfile(filename) or not self._serves(filename):
+          continue
+        loader = RistLoader(fullname, filename, self.macro_py, self.cache)
+        return importlib.util.spec_from_file_location(
+          fullname, filename, loader=loader,
+          submodule_search_locations=[os.path.dirname(filename)] if is_package else None
+        )
+    return None
+
+  def _serves(self, filename: str) -> bool:
+    if filename in self.ignore:
+      return False
+    return self.dirs is None or os.path.dirname(filename) in self.dirs
+
+  def invalidate_caches(self) -> None:
+    pass
+
+
+def get_import_cache(cache=None) -> Optional[CompileCache]:
+  # Unlike rist(), imports are cached by default, pass cache=False to opt out
+  if cache is False:
+    return None
+  return get_cache(cache or default_cache_dir())
+
+def install(
+  dirs: Iterable[str] = None,
+  ignore: Iterable[str] = (),
+  macro_py: Dict[str, List[str]] = None,
+  cache=None
+) -> RistFinder:
+  finder = RistFinder(dirs, ignore, macro_py, get_import_cache(cache))
+  sys.meta_path.insert(0, finder)
+  return finder
+
+def uninstall(finder: RistFinder) -> None:
+  try:
+    sys.meta_path.remove(finder)
+  except ValueError:
+    pass
+
+def run_main(
+  path: str,
+  macro_py: Dict[str, List[str]] = None,
+  cache=None,
+  argv: Sequence[str] = None
+) -> ModuleType:
+  # Runs a rist file as the __main__ module, like ``python file.py`` would
+  path = os.path.abspath(path)
+  loader = RistLoader("__main__", path, macro_py, get_import_cache(cache))
+  spec = importlib.util.spec_from_file_location("__main__", path, loader=loader)
+  module = importlib.util.module_from_spec(spec)
+
+  main_module = sys.modules.get("__main__")
+  old_argv = sys.argv
+  sys.modules["__main__"] = module
+  sys.argv = [path, *(old_argv[1:] if argv is None else argv)]
+  try:
+    with phase("exec"):
+      loader.exec_module(module)
+  finally:
+    if main_module is not None:
+      sys.modules["__main__"] = main_module
+    sys.argv = old_argv
+  return module
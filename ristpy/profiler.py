@@ -0,0 +1,155 @@
+import os
+import sys
+import pstats
+import cProfile
+
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, TextIO, Tuple
+
+from .compiler import CompiledCode, LineMap, get_compiler
+from .executor import compile_runner, run_compiled
+from .snippets import SnippetRegistry
+
+
+__all__ = ("Profiler", "ProfileReport", "profile")
+
+# ristpy's own frames (the runner, the executor) are left out of reports
+_PACKAGE = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+class ProfileReport:
+  __slots__ = ("functions", "lines")
+
+  def __init__(self) -> None:
+    # ``(location, name, calls, own seconds, cumulative seconds)``
+    self.functions: List[Tuple[str, str, int, float, float]] = []
+    # ``(location, hits, source text)``
+    self.lines: List[Tuple[str, int, str]] = []
+
+  def format(self, top: int = 20) -> str:
+    out = [f"{'calls':>9} {'tottime':>9} {'cumtime':>9}  function"]
+    for location, name, calls, tottime, cumtime in self.functions[:top]:
+      out.append(f"{calls:>9} {tottime:>9.4f} {cumtime:>9.4f}  {name} ({location})")
+    if self.lines:
+      out.append("")
+      out.append(f"{'hits':>9}  line")
+      for location, hits, text in self.lines[:top]:
+        out.append(f"{hits:>9}  {location}  {text.strip()}")
+    return "\n".join(out)
+
+
+class Profiler:
+  # Runs compiled rist code under cProfile while counting the lines it runs,
+  # then reports both in rist coordinates through the code's line map.
+  # Lines are counted with sys.monitoring when there is one, else settrace.
+  def __init__(
+    self,
+    code: CompiledCode,
+    source: Sequence[str] = (),
+    snippets: Optional[SnippetRegistry] = None
+  ) -> None:
+    if code.line_map is None:
+      raise ValueError("The code has no line map, compile it without a cache")
+    self.code = code
+    self.fname = code.file
+    self.line_map: LineMap = code.line_map
+    # Source lines by file, for showing the hot lines
+    self.sources: Dict[str, Sequence[str]] = {self.fname: source}
+    for name, lines in (snippets.sources.items() if snippets else ()):
+      self.sources[f"<macro_{name}>"] = lines
+    self.profile = cProfile.Profile()
+    self.hits: Counter = Counter()
+
+  def run(self, func: Callable = run_compiled, *args):
+    # Compiled beforehand so the runner's compile isn't in the profile
+    if self.code._code_object is None:
+      self.code._code_object = compile_runner(str(self.code), self.fname)
+    stop = self._count_lines()
+    try:
+      return self.profile.runcall(func, *(args or (self.code,)))
+    finally:
+      stop()
+
+  def _count_lines(self) -> Callable[[], None]:
+    fname, hits = self.fname, self.hits
+    monitoring = getattr(sys, "monitoring", None)
+    if monitoring is not None:
+      tool = monitoring.COVERAGE_ID
+      monitoring.use_tool_id(tool, "ristpy")
+      def line(code, lineno):
+        if code.co_filename != fname:
+          return monitoring.DISABLE
+        hits[lineno] += 1
+      monitoring.register_callback(tool, monitoring.events.LINE, line)
+      monitoring.set_events(tool, monitoring.events.LINE)
+      def stop():
+        monitoring.set_events(tool, 0)
+        monitoring.register_callback(tool, monitoring.events.LINE, None)
+        monitoring.free_tool_id(tool)
+      return stop
+
+    def local(frame, event, arg):
+      if event == "line":
+        hits[frame.f_lineno] += 1
+      return local
+    def trace(frame, event, arg):
+      return local if frame.f_code.co_filename == fname else None
+    old = sys.gettrace()
+    sys.settrace(trace)
+    return lambda: sys.settrace(old)
+
+  def locate(self, filename: str, line: int) -> Optional[Tuple[str, int]]:
+    if filename != self.fname:
+      return filename, line
+    return self.line_map.lookup(line)
+
+  def report(self) -> ProfileReport:
+    report = ProfileReport()
+    stats = pstats.Stats(self.profile).stats
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items():
+      if filename == "~":
+        location = "builtin"
+      elif filename.startswith(_PACKAGE):
+        continue
+      else:
+        where = self.locate(filename, line)
+        # The runner's own lines map nowhere, it stands for the module
+        if where is None:
+          location, name = self.fname, "<module>"
+        else:
+          location = "{0}:{1}".format(*where)
+      report.functions.append((location, name, calls, tottime, cumtime))
+    report.functions.sort(key=lambda f: f[3], reverse=True)
+
+    lines = Counter()
+    for line, hits in self.hits.items():
+      where = self.line_map.lookup(line)
+      if where is not None:
+        lines[where] += hits
+    for (filename, line), hits in lines.most_common():
+      source = self.sources.get(filename, ())
+      text = source[line - 1] if 0 < line <= len(source) else ""
+      report.lines.append((f"{filename}:{line}", hits, text))
+    return report
+
+
+def profile(
+  path: str,
+  macros: Dict[str, str] = None,
+  macros_py: Dict[str, List[str]] = None,
+  top: int = 20,
+  out: TextIO = None
+) -> ProfileReport:
+  # Runs a rist file like ``rist run`` does and prints where its time went,
+  # also when the program raised
+  snippets = SnippetRegistry(macros, macros_py)
+  with open(path, "r") as f:
+    source = f.read()
+  code = get_compiler().compile(source, path, snippets)
+  profiler = Profiler(code, source.splitlines(), snippets)
+  try:
+    profiler.run()
+  finally:
+    report = profiler.report()
+    print(report.format(top), file=out or sys.stdout)
+  return report
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import signal
+import marshal
+import hashlib
+import zipfile
+import tempfile
+import zipimport
+import subprocess
+import importlib.util
+
+from typing import Dict, List
+
+from . import __version__
+from .batch import compile_many
+from .cache import CompileCache
+from .snippets import SnippetRegistry, snippets_digest, used_snippets
+from .importer import (
+  RistFinder, install, uninstall, run_main,
+  module_key, get_import_cache
+)
+
+
+__all__ = ("Project", "BuildReport")
+
+
+class BuildReport:
+  __slots__ = ("compiled", "skipped", "errors", "seconds")
+
+  def __init__(self) -> None:
+    self.compiled: List[str] = []
+    self.skipped: List[str] = []
+    self.errors: Dict[str, Exception] = {}
+    self.seconds = 0.0
+
+  def __str__(self) -> str:
+    return "compiled {0}, skipped {1}, failed {2} files in {3:.3f}s".format(
+      len(self.compiled), len(self.skipped), len(self.errors), self.seconds
+    )
+
+
+class Project:
+  # A directory holding a ``ristconf.json``
+  def __init__(self, root: str = ".") -> None:
+    self.root = os.path.abspath(root)
+    conf_file = os.path.join(self.root, "ristconf.json")
+    if not os.path.isfile(conf_file):
+      raise FileNotFoundError("A file named 'ristconf.json' should must be in the project directory")
+    with open(conf_file, "r") as f:
+      self.conf = conf = json.load(f)
+
+    main = conf.get("main") or ""
+    assert bool(main) is True, "A setting named 'main' should must be in the config file"
+    assert main.endswith(".rist"), "Your main file should must be a rist file"
+    self.main = self.path(main)
+
+    self.macros: Dict[str, str] = {}
+    for name, snippet in conf.get("snippets", {}).items():
+      self.macros[name] = "\n".join(snippet) if type(snippet) is list else snippet
+
+    self.macros_py: Dict[str, List[str]] = {}
+    for name, snippet in conf.get("snippets_py", {}).items():
+      if type(snippet) is list:
+        snippet = "\n".join(snippet)
+      self.macros_py[name] = snippet.splitlines()
+
+    dirs = list(conf.get("dirs") or [])
+    if "." not in dirs: dirs.append(".")
+    self.dirs = [self.path(d) for d in dirs]
+    self.ignore = {self.path(f) for f in conf.get("ignore") or []}
+    self.ignore.add(self.main)
+    self._snippets = None
+
+  def path(self, name: str) -> str:
+    return os.path.normpath(os.path.join(self.root, name))
+
+  def snippets(self) -> SnippetRegistry:
+    # Python expansion of every snippet, the rist ones compiled once
+    if self._snippets is None:
+      self._snippets = SnippetRegistry(self.macros, self.macros_py)
+    return self._snippets
+
+  def files(self) -> List[str]:
+    # Every rist file of the project, except the ignored ones and main
+    files = []
+    for d in self.dirs:
+      for name in sorted(os.listdir(d)):
+        path = os.path.join(d, name)
+        if name.endswith(".rist") and path not in self.ignore:
+          files.append(path)
+    return files
+
+  def build(self, cache=None, jobs: int = None) -> BuildReport:
+    # Compiles the out of date files into the import cache. A manifest of
+    # source stats and used snippets lets unchanged files be skipped without
+    # reading them, touched files are hashed and skipped when their
+    # content-addressed entry already exists. Entries are never rewritten.
+    report = BuildReport()
+    start = time.perf_counter()
+    cache = get_import_cache(cache)
+    if cache is None:
+      raise ValueError("A compile cache is needed to build the project")
+    snippets = self.snippets()
+    manifest_file = self._manifest_file(cache)
+    manifest = self._load_manifest(manifest_file)
+    files = {}
+
+    stale = []
+    for path in self.files() + [self.main]:
+      st = os.stat(path)
+      record = manifest.get(path)
+      if (
+        record is not None
+        and record["mtime_ns"] == st.st_mtime_ns
+        and record["size"] == st.st_size
+        and record["snippets"] == self._used_snippets_digest(record["uses"], snippets)
+        and os.path.exists(cache.path(record["key"]))
+      ):
+        files[path] = record
+        report.skipped.append(path)
+        continue
+
+      with open(path, "r") as f:
+        source = f.read()
+      key = module_key(cache, source, path, snippets)
+      uses = used_snippets(source)
+      files[path] = {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "uses": uses,
+        "snippets": self._used_snippets_digest(uses, snippets),
+        "key": key,
+      }
+      if os.path.exists(cache.path(key)):
+        report.skipped.append(path)
+      else:
+        stale.append(path)
+
+    for result in compile_many(stale, jobs, macros_py=snippets, cache=cache, module=True):
+      if result.ok:
+        report.compiled.append(result.path)
+      else:
+        report.errors[result.path] = result.error
+        del files[result.path]
+
+    self._save_manifest(manifest_file, files)
+    report.seconds = time.perf_counter() - start
+    return report
+
+  @staticmethod
+  def _used_snippets_digest(uses: List[str], snippets: SnippetRegistry) -> str:
+    return snippets_digest({name: snippets[name] for name in uses if name in snippets})
+
+  def _manifest_file(self, cache: CompileCache) -> str:
+    name = hashlib.sha256(self.root.encode()).hexdigest()[:32]
+    return os.path.join(cache.directory, "manifests", name + ".json")
+
+  @staticmethod
+  def _load_manifest(manifest_file: str) -> dict:
+    try:
+      with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+    except (OSError, ValueError):
+      return {}
+    if manifest.get("version") != __version__:
+      return {}
+    return manifest.get("files", {})
+
+  @staticmethod
+  def _save_manifest(manifest_file: str, files: dict) -> None:
+    directory = os.path.dirname(manifest_file)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    with os.fdopen(fd, "w") as f:
+      json.dump({"version": __version__, "files": files}, f)
+    os.replace(tmp, manifest_file)
+
+  def module_name(self, path: str) -> str:
+    # Name of a project file when imported, from its path under the root
+    name = os.path.splitext(os.path.relpath(path, self.root))[0]
+    if name.startswith(os.pardir + os.sep):
+      raise ValueError(f"{path} is outside of the project directory")
+    parts = name.split(os.sep)
+    if parts[-1] == "__init__":
+      parts.pop()
+    return ".".join(parts)
+
+  def bundle(self, output: str, cache=None, jobs: int = None, interpreter: str = None, optimize: int = -1, compressed: bool = False) -> BuildReport:
+    # Compiles the whole project into a zip application of sourceless
+    # ``.pyc`` files, main being its ``__main__``, which ``python output``
+    # runs through zipimport without rist. Directories get an empty package
+    # for the modules in them, zipimport has no namespace packages. The
+    # bytecode is only loaded by the python it was built with. Nothing is
+    # written when a file fails.
+    report = BuildReport()
+    start = time.perf_counter()
+    files = self.files()
+    entries = {}
+    for path in files:
+      name = self.module_name(path)
+      entries[path] = name.replace(".", "/") + ("/__init__.pyc" if path.endswith("__init__.rist") else ".pyc")
+    entries[self.main] = "__main__.pyc"
+
+    members = {}
+    results = compile_many(files + [self.main], jobs, macros_py=self.snippets(), cache=get_import_cache(cache), module=True)
+    for result in results:
+      if not result.ok:
+        report.errors[result.path] = result.error
+        continue
+      try:
+        code = compile(str(result.code), os.path.relpath(result.path, self.root), "exec", dont_inherit=True, optimize=optimize)
+      except SyntaxError as e:
+        report.errors[result.path] = e
+        continue
+      members[entries[result.path]] = _pyc(code)
+      report.compiled.append(result.path)
+
+    if not report.errors:
+      for member in list(members):
+        package = os.path.dirname(member)
+        while package:
+          if package + "/__init__.pyc" not in members:
+            members[package + "/__init__.pyc"] = _pyc(compile("", package + "/__init__.py", "exec", dont_inherit=True))
+          package = os.path.dirname(package)
+      _write_bundle(output, members, interpreter, compressed)
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+  def install_importer(self, cache=None) -> RistFinder:
+    return install(self.dirs, self.ignore, self.snippets(), cache)
+
+  def run(self, cache=None) -> None:
+    # Runs main with the project modules importable, like ``python main.py``
+    finder = self.install_importer(cache)
+    sys.path.insert(0, self.root)
+    try:
+      run_main(self.main, self.snippets(), cache, argv=())
+    finally:
+      sys.path.remove(self.root)
+      uninstall(finder)
+
+  def spawn(self, cache=None) -> subprocess.Popen:
+    # Starts main in a fresh interpreter without waiting for it
+    env = dict(os.environ)
+    if isinstance(cache, CompileCache):
+      cache = cache.directory
+    if cache:
+      env["RIST_CACHE_DIR"] = os.path.abspath(cache)
+    bootstrap = f"from ristpy.project import Project; Project({self.root!r}).run()"
+    return subprocess.Popen([sys.executable, "-c", bootstrap], cwd=os.getcwd(), env=env)
+
+  def run_subprocess(self, cache=None) -> int:
+    # Runs main in a fresh interpreter and returns its exit status, negative
+    # when it was killed by a signal. Ctrl-C reaches the child through the
+    # terminal, SIGTERM sent to this process is forwarded to it.
+    child = self.spawn(cache)
+
+    handlers = {}
+    def forward(signum, frame):
+      child.send_signal(signum)
+    try:
+      handlers[signal.SIGINT] = signal.signal(signal.SIGINT, signal.SIG_IGN)
+      handlers[signal.SIGTERM] = signal.signal(signal.SIGTERM, forward)
+    except ValueError:
+      # Not in the main thread, signals stay with the caller
+      pass
+    try:
+      return child.wait()
+    finally:
+      for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+def _pyc(code) -> bytes:
+  # A timestamp pyc without source, the time and size are never checked
+  return importlib.util.MAGIC_NUMBER + bytes(12) + marshal.dumps(code)
+
+def _write_bundle(output: str, members: Dict[str, bytes], interpreter: str = None, compressed: bool = False) -> None:
+  # Members in order with a fixed date, the same project gives the same
+  # bytes. Written to a temporary file which replaces ``output`` when done.
+  directory = os.path.dirname(os.path.abspath(output))
+  fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+  try:
+    with os.fdopen(fd, "wb") as f:
+      if interpreter:
+        f.write(b"#!" + interpreter.encode() + b"\n")
+      with zipfile.ZipFile(f, "w") as z:
+        for member in sorted(members):
+          info = zipfile.ZipInfo(member, (1980, 1, 1, 0, 0, 0))
+          info.compress_type = zipfile.ZIP_DEFLATED if compressed else zipfile.ZIP_STORED
+          info.external_attr = 0o644 << 16
+          z.writestr(info, members[member])
+
+    # Every module has to load from the archive alone
+    for member in members:
+      package, _, name = member.rpartition("/")
+      zipimport.zipimporter(os.path.join(tmp, package)).get_code(name[:-len(".pyc")])
+    os.chmod(tmp, 0o755 if interpreter else 0o644)
+    os.replace(tmp, output)
+  except BaseException:
+    os.remove(tmp)
+    raise
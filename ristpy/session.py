@@ -0,0 +1,137 @@
+import dis
+
+from collections import OrderedDict
+from functools import lru_cache
+from types import CellType, CodeType, FunctionType
+from typing import Any, Dict, List
+
+from .cache import get_cache, compile_cached
+from .compiler import CompiledCode
+from .executor import Scope, run_compiled, run_compiled_async
+
+
+__all__ = ("Session",)
+
+
+class Session:
+  # Runs many snippets against the same globals, like a REPL. Snippets are
+  # compiled once, running the same source again reuses its runner.
+  def __init__(
+    self,
+    globals_: dict = None,
+    macros_py: Dict[str, List[str]] = None,
+    cache=None,
+    max_compiled: int = 256
+  ) -> None:
+    self.scope = Scope(globals_)
+    self.macros_py = macros_py or {}
+    self.cache = get_cache(cache)
+    self.max_compiled = max_compiled
+    self._compiled: "OrderedDict[tuple, CompiledCode]" = OrderedDict()
+
+  def compile(self, code: str, fname: str = "<session>") -> CompiledCode:
+    key = (code, fname)
+    compiled = self._compiled.get(key)
+    if compiled is None:
+      compiled = self._compiled[key] = compile_cached(code, fname, self.macros_py, self.cache)
+      if len(self._compiled) > self.max_compiled:
+        self._compiled.popitem(last=False)
+    else:
+      self._compiled.move_to_end(key)
+    return compiled
+
+  def run(self, code: str, fname: str = "<session>") -> Any:
+    # Returns the value of the snippet's last expression, if any
+    return run_compiled(self.compile(code, fname), self.scope)
+
+  async def run_async(self, code: str, fname: str = "<session>") -> Any:
+    # run() on the running event loop, the snippet may await at the top level
+    return await run_compiled_async(self.compile(code, fname), self.scope)
+
+  def fork(self) -> "Session":
+    # exec() needs real dicts, so a fork copies the globals (shallowly, the
+    # objects themselves are shared) instead of being copy-on-write. That is
+    # one dict copy, the setup code which filled them never runs again.
+    # Functions of the session are copied too, bound to the fork's globals,
+    # so they can not change the base's.
+    globals_ = dict(self.scope.globals)
+    _Rebinder(self.scope.globals, globals_).rebind_all()
+    session = Session(globals_, self.macros_py, self.cache, self.max_compiled)
+    session._compiled = self._compiled.copy()
+    return session
+
+  def __getitem__(self, name: str) -> Any:
+    return self.scope.globals[name]
+
+  def __setitem__(self, name: str, value: Any) -> None:
+    self.scope.globals[name] = value
+
+
+class _Rebinder:
+  # Copies the functions whose globals are ``base`` into ``globals_``. The
+  # runner is a function, so the session's functions also close over its
+  # locals, other functions among them: their cells are copied as well, one
+  # per cell, holding the copies. Cells are filled once the functions exist,
+  # for functions which close over each other.
+  def __init__(self, base: dict, globals_: dict) -> None:
+    self.base = base
+    self.globals = globals_
+    self.copies: Dict[int, Any] = {}
+    self.unfilled: List[tuple] = []
+
+  def rebind_all(self) -> None:
+    globals_ = self.globals
+    for name, value in globals_.items():
+      if isinstance(value, type):
+        self.check_class(name, value)
+      else:
+        globals_[name] = self.rebind(value)
+    while self.unfilled:
+      cell, copy = self.unfilled.pop()
+      try:
+        contents = cell.cell_contents
+      except ValueError:
+        continue
+      copy.cell_contents = self.rebind(contents)
+
+  def rebind(self, value: Any) -> Any:
+    if isinstance(value, FunctionType) and value.__globals__ is self.base:
+      return self.function(value)
+    return value
+
+  def function(self, f: FunctionType) -> FunctionType:
+    copy = self.copies.get(id(f))
+    if copy is None:
+      closure = tuple(self.cell(cell) for cell in f.__closure__) if f.__closure__ else None
+      copy = FunctionType(f.__code__, self.globals, f.__name__, f.__defaults__, closure)
+      copy.__kwdefaults__ = f.__kwdefaults__
+      copy.__qualname__ = f.__qualname__
+      copy.__annotations__ = f.__annotations__
+      copy.__doc__ = f.__doc__
+      copy.__module__ = f.__module__
+      copy.__dict__.update(f.__dict__)
+      self.copies[id(f)] = copy
+    return copy
+
+  def cell(self, cell):
+    copy = self.copies.get(id(cell))
+    if copy is None:
+      copy = self.copies[id(cell)] = CellType()
+      self.unfilled.append((cell, copy))
+    return copy
+
+  def check_class(self, name: str, cls: type) -> None:
+    # A class can not be copied (super() holds on to it), its methods stay
+    # bound to the base. Those which assign globals would change the base's.
+    for attr, value in vars(cls).items():
+      value = getattr(value, "__func__", value)
+      if isinstance(value, FunctionType) and value.__globals__ is self.base and _writes_globals(value.__code__):
+        raise ValueError(f"Can not fork the session, {name}.{attr} assigns globals of the session")
+
+
+@lru_cache(maxsize=1024)
+def _writes_globals(code: CodeType) -> bool:
+  for instruction in dis.get_instructions(code):
+    if instruction.opname in ("STORE_GLOBAL", "DELETE_GLOBAL"):
+      return True
+  return any(_writes_globals(const) for const in code.co_consts if isinstance(const, CodeType))
@@ -0,0 +1,117 @@
+import re
+import hashlib
+
+from typing import Dict, Iterator, List, Mapping, Tuple, Union
+
+from .compiler import LineMap, get_compiler
+
+
+__all__ = ("SnippetRegistry", "used_snippets", "snippets_digest")
+
+
+_MACRO_USE = re.compile(r"^[^\S\n]*%-[^\S\n]*([a-zA-Z_][a-zA-Z0-9_]*)[^\S\n]*-%", re.MULTILINE)
+
+def used_snippets(source: str) -> List[str]:
+  return sorted(set(_MACRO_USE.findall(source)))
+
+def snippets_digest(macro_py: Mapping[str, List[str]]) -> str:
+  h = hashlib.sha256()
+  for name in sorted(macro_py):
+    h.update(name.encode() + b"\0")
+    h.update("\n".join(macro_py[name]).encode() + b"\0\0")
+  return h.hexdigest()
+
+
+# Compiled rist snippets by the hash of their source and of what they expand,
+# shared by every registry of the process
+_expansions: Dict[str, Tuple[Tuple[str, ...], LineMap]] = {}
+
+
+class SnippetRegistry(Mapping):
+  # Python lines of every snippet, by name. Rist snippets are compiled once,
+  # after the snippets they use, and expansions are kept joined per indent.
+  def __init__(
+    self,
+    macros: Mapping[str, Union[str, List[str]]] = None,
+    macros_py: Mapping[str, Union[str, List[str]]] = None
+  ) -> None:
+    self._lines: Dict[str, Tuple[str, ...]] = {}
+    self._indented: Dict[Tuple[str, str], str] = {}
+    # Source lines of every snippet and line maps of the rist ones
+    self.sources: Dict[str, Tuple[str, ...]] = {}
+    self.line_maps: Dict[str, LineMap] = {}
+    for name, snippet in (macros_py or {}).items():
+      self._lines[name] = self.sources[name] = tuple(_split(snippet))
+
+    sources = {}
+    for name, snippet in (macros or {}).items():
+      assert name not in self._lines, "Name of all the snippets should be unique"
+      sources[name] = snippet if type(snippet) is str else "\n".join(snippet)
+    for name in self._order(sources):
+      self._lines[name], self.line_maps[name] = self._compile(name, sources[name])
+      self.sources[name] = tuple(sources[name].splitlines())
+    self.digest = snippets_digest(self)
+
+  def _order(self, sources: Dict[str, str]) -> List[str]:
+    # Rist snippets in dependency order, a snippet comes after those it uses
+    order, state = [], {}
+    for root in sources:
+      if root in state:
+        continue
+      state[root] = 1
+      stack = [(root, iter(used_snippets(sources[root])))]
+      while stack:
+        name, deps = stack[-1]
+        for dep in deps:
+          if dep not in sources or state.get(dep) == 2:
+            continue
+          if state.get(dep) == 1:
+            cycle = [n for n, _ in stack]
+            cycle = cycle[cycle.index(dep):] + [dep]
+            raise ValueError("Snippets use each other: " + " -> ".join(cycle))
+          state[dep] = 1
+          stack.append((dep, iter(used_snippets(sources[dep]))))
+          break
+        else:
+          stack.pop()
+          state[name] = 2
+          order.append(name)
+    return order
+
+  def _compile(self, name: str, source: str) -> Tuple[Tuple[str, ...], LineMap]:
+    h = hashlib.sha256(name.encode() + b"\0" + source.encode())
+    for dep in used_snippets(source):
+      if dep in self._lines:
+        h.update(b"\0" + dep.encode() + b"\0" + "\n".join(self._lines[dep]).encode())
+    key = h.hexdigest()
+    entry = _expansions.get(key)
+    if entry is None:
+      compiled = get_compiler().compile(source, f"<macro_{name}>", self)
+      entry = _expansions[key] = tuple(compiled.splitlines()), compiled.line_map
+    return entry
+
+  def expand(self, name: str, indent: str = "") -> str:
+    # The snippet as it replaces a ``%- name -%`` line indented by ``indent``
+    key = (name, indent)
+    text = self._indented.get(key)
+    if text is None:
+      text = self._indented[key] = indent + f"\n{indent}".join(self._lines[name])
+    return text
+
+  def __getitem__(self, name: str) -> Tuple[str, ...]:
+    return self._lines[name]
+
+  def __iter__(self) -> Iterator[str]:
+    return iter(self._lines)
+
+  def __len__(self) -> int:
+    return len(self._lines)
+
+  def __repr__(self) -> str:
+    return f"<SnippetRegistry {list(self._lines)}>"
+
+
+def _split(snippet: Union[str, List[str]]) -> List[str]:
+  if type(snippet) is not str:
+    snippet = "\n".join(snippet)
+  return snippet.splitlines()
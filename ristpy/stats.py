@@ -0,0 +1,149 @@
+import time
+import tracemalloc
+import contextvars
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional
+
+from .compiler import get_compiler
+
+
+__all__ = ("CompileStats", "phase", "count", "count_source", "active")
+
+
+_active: contextvars.ContextVar = contextvars.ContextVar("ristpy_stats", default=None)
+_nothing = nullcontext()
+# Python 3.8 has no tracemalloc.reset_peak()
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+
+
+class CompileStats:
+  # Wall time, calls and (with trace_memory) the tracemalloc peak of every
+  # phase run while the stats are active, ``with CompileStats() as stats:``.
+  # Phases: read, translate, cache, wrap, compile, exec and write. Phases
+  # nest, exec includes compiling the modules imported while it runs.
+  #
+  # Token counts come from lexing the source again after it translated, so
+  # they never add to the time of translate. Pass tokens=False to skip it.
+  def __init__(
+    self,
+    trace_memory: bool = False,
+    tokens: bool = True,
+    callback: Callable[["CompileStats"], None] = None
+  ) -> None:
+    self.trace_memory = trace_memory
+    self.tokens = tokens
+    self.callback = callback
+    self.seconds: Dict[str, float] = Counter()
+    self.calls: Dict[str, int] = Counter()
+    self.peaks: Dict[str, int] = {}
+    self.counts: Dict[str, int] = Counter()
+    self._token = None
+    self._started_tracing = False
+    # Peaks of the phases running, the outer ones as they were when an inner
+    # one reset the peak
+    self._running: List[int] = []
+
+  def __enter__(self) -> "CompileStats":
+    self._token = _active.set(self)
+    if self.trace_memory and not tracemalloc.is_tracing():
+      tracemalloc.start()
+      self._started_tracing = True
+    return self
+
+  def __exit__(self, *exc) -> None:
+    _active.reset(self._token)
+    if self._started_tracing:
+      tracemalloc.stop()
+      self._started_tracing = False
+    if self.callback is not None:
+      self.callback(self)
+
+  @contextmanager
+  def phase(self, name: str):
+    trace = self.trace_memory and tracemalloc.is_tracing()
+    if trace:
+      current, peak = tracemalloc.get_traced_memory()
+      if _reset_peak is not None:
+        running = self._running
+        if running:
+          running[-1] = max(running[-1], peak)
+        running.append(0)
+        _reset_peak()
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.seconds[name] += time.perf_counter() - start
+      self.calls[name] += 1
+      if trace:
+        self.peaks[name] = max(self.peaks.get(name, 0), self._phase_peak(current, peak))
+
+  def _phase_peak(self, current: int, peak: int) -> int:
+    # Peak of the phase which started at ``(current, peak)``
+    end_current, end_peak = tracemalloc.get_traced_memory()
+    if _reset_peak is None:
+      # Without resets the peak is only the phase's when it grew during it,
+      # else the most the phase is known to have held
+      return end_peak if end_peak > peak else max(current, end_current)
+    running = self._running
+    own = max(running.pop(), end_peak)
+    if running:
+      running[-1] = max(running[-1], own)
+    return own
+
+  def count(self, name: str, n: int = 1) -> None:
+    self.counts[name] += n
+
+  def count_source(self, source: str, fname: str = "<unknown.rist>", macro_py=None) -> None:
+    self.counts["files"] += 1
+    self.counts["lines"] += source.count("\n") + (not source.endswith("\n"))
+    self.counts["bytes"] += len(source)
+    if not self.tokens:
+      return
+    tokens = get_compiler().tokenize(source, fname, macro_py)
+    names = tokens.names
+    for kind, n in Counter(tokens.kinds).items():
+      self.counts["tokens." + names[kind]] += n
+    self.counts["tokens"] += len(tokens)
+
+  def as_dict(self) -> dict:
+    return {
+      "phases": {
+        name: {"seconds": self.seconds[name], "calls": self.calls[name], "peak_bytes": self.peaks.get(name)}
+        for name in self.seconds
+      },
+      "counts": dict(self.counts),
+    }
+
+  def __str__(self) -> str:
+    out = [f"{'phase':<10} {'calls':>6} {'ms':>10} {'peak KiB':>10}"]
+    for name, seconds in self.seconds.items():
+      peak = self.peaks.get(name)
+      peak = "-" if peak is None else f"{peak / 1024:.1f}"
+      out.append(f"{name:<10} {self.calls[name]:>6} {seconds * 1000:>10.3f} {peak:>10}")
+    for name in ("files", "lines", "bytes", "tokens"):
+      if name in self.counts:
+        out.append(f"{name}: {self.counts[name]}")
+    return "\n".join(out)
+
+
+def active() -> Optional[CompileStats]:
+  return _active.get()
+
+def phase(name: str):
+  # Times a phase into the active stats, does nothing when there are none
+  stats = _active.get()
+  return _nothing if stats is None else stats.phase(name)
+
+def count(name: str, n: int = 1) -> None:
+  stats = _active.get()
+  if stats is not None:
+    stats.count(name, n)
+
+def count_source(source: str, fname: str = "<unknown.rist>", macro_py=None) -> None:
+  # Counts a source which just translated, with its tokens
+  stats = _active.get()
+  if stats is not None:
+    stats.count_source(source, fname, macro_py)
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from typing import IO, Dict, List, Union
+
+from .compiler import get_compiler
+from .snippets import SnippetRegistry
+
+
+__all__ = ("compile_stream",)
+
+
+def compile_stream(
+  src: Union[str, IO[str]],
+  dst: Union[str, IO[str]],
+  fname: str = None,
+  macros: Dict[str, str] = None,
+  macros_py: Dict[str, List[str]] = None,
+  chunk_lines: int = 1024
+) -> None:
+  # Compiles ``src`` into ``dst`` a chunk of lines at a time, so memory use
+  # does not grow with the file. Both are paths or text files. A ``dst`` path
+  # is only replaced once the whole source compiled.
+  if macros or (macros_py and not isinstance(macros_py, SnippetRegistry)):
+    macros_py = SnippetRegistry(macros, macros_py)
+
+  if isinstance(src, str):
+    with open(src, "r") as f:
+      return compile_stream(f, dst, fname or src, None, macros_py, chunk_lines)
+  fname = fname or getattr(src, "name", None) or "<unknown.rist>"
+  chunks = get_compiler().translate_stream(src, fname, macros_py, chunk_lines)
+
+  if not isinstance(dst, str):
+    for chunk in chunks:
+      dst.write(chunk)
+    return
+
+  directory = os.path.dirname(os.path.abspath(dst))
+  fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".py", dir=directory)
+  try:
+    with os.fdopen(fd, "w") as f:
+      for chunk in chunks:
+        f.write(chunk)
+    # mkstemp() creates the file readable by its owner only
+    os.chmod(tmp, os.stat(dst).st_mode & 0o777 if os.path.exists(dst) else 0o644)
+    os.replace(tmp, dst)
+  except BaseException:
+    os.remove(tmp)
+    raise
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import subprocess
+
+from typing import Dict, Optional, TextIO, Tuple
+
+from .project import Project
+from .importer import get_import_cache
+
+
+__all__ = ("Watcher",)
+
+
+class Watcher:
+  # Polls a project and keeps its import cache up to date. Only stat() is
+  # used to notice changes, the compiling is left to Project.build(), which
+  # recompiles the changed files and those expanding a changed snippet.
+  def __init__(
+    self,
+    root: str = ".",
+    cache=None,
+    interval: float = 0.5,
+    restart: bool = False,
+    out: TextIO = None
+  ) -> None:
+    self.root = os.path.abspath(root)
+    self.cache = get_import_cache(cache)
+    self.interval = interval
+    self.restart = restart
+    self.out = out or sys.stderr
+    self.project = Project(self.root)
+    self.child: Optional[subprocess.Popen] = None
+    self.stats: Dict[str, Tuple[int, int]] = {}
+
+  def scan(self) -> Dict[str, Tuple[int, int]]:
+    stats = {}
+    for path in [os.path.join(self.root, "ristconf.json"), self.project.main, *self.project.files()]:
+      try:
+        st = os.stat(path)
+      except FileNotFoundError:
+        continue
+      stats[path] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+  def poll(self) -> bool:
+    # Rebuilds when anything changed since the last poll, returns whether it did
+    stats = self.scan()
+    changed = sorted(path for path in stats.keys() | self.stats.keys() if stats.get(path) != self.stats.get(path))
+    first = not self.stats
+    self.stats = stats
+    if not changed:
+      return False
+
+    start = time.perf_counter()
+    names = ", ".join(os.path.relpath(path, self.root) for path in changed[:3])
+    if first:
+      names = "initial build"
+    elif len(changed) > 3:
+      names += f" and {len(changed) - 3} more"
+    try:
+      if any(os.path.basename(path) == "ristconf.json" for path in changed):
+        self.project = Project(self.root)
+        self.stats = self.scan()
+      report = self.project.build(self.cache, jobs=1)
+    except Exception as e:
+      self.log(f"{names}: {e.__class__.__name__}: {e}")
+      return True
+
+    for path, error in report.errors.items():
+      self.log(f"{os.path.relpath(path, self.root)}: {error.__class__.__name__}: {error}")
+    if self.restart and not report.errors:
+      self.start()
+    self.log(f"{names}: compiled {len(report.compiled)} files in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return True
+
+  def start(self) -> None:
+    self.stop()
+    self.child = self.project.spawn(self.cache)
+
+  def stop(self) -> None:
+    if self.child is None or self.child.poll() is not None:
+      return
+    self.child.terminate()
+    try:
+      self.child.wait(5)
+    except subprocess.TimeoutExpired:
+      self.child.kill()
+      self.child.wait()
+
+  def run(self) -> None:
+    self.log(f"watching {self.root}")
+    try:
+      while True:
+        self.poll()
+        time.sleep(self.interval)
+    except KeyboardInterrupt:
+      pass
+    finally:
+      self.stop()
+
+  def log(self, message: str) -> None:
+    print(f"[rist watch] {message}", file=self.out, flush=True)
@@ -1,7 +1,10 @@
+import re
+
 from setuptools import setup, find_packages
 
 
-version = "1.2.1"
+with open("ristpy/__init__.py", "r") as f:
+  version = re.search(r'^__version__ = "([^"]+)"', f.read(), re.MULTILINE).group(1)
 
 with open("README.md", "r") as f:
   long_description = f.read()
@@ -0,0 +1,46 @@
+import unittest
+
+from ristpy import Session
+
+
+SETUP = """
+counter = 0
+helper${}:
+  $ret 1
+bump${}:
+  global counter
+  counter += helper{}
+  $ret counter
+"""
+
+
+class ForkTest(unittest.TestCase):
+  def test_fork_can_not_change_the_base(self):
+    base = Session()
+    base.run(SETUP)
+    first, second = base.fork(), base.fork()
+    first.run("bump{}")
+    first.run("bump{}")
+    self.assertEqual(second.run("bump{}"), 1)
+    self.assertEqual(first["counter"], 2)
+    self.assertEqual(second["counter"], 1)
+    self.assertEqual(base["counter"], 0)
+
+  def test_fork_copies_functions_closing_over_each_other(self):
+    base = Session()
+    base.run("even${n}:\n  $ret n == 0 or odd{n - 1}\nodd${n}:\n  $ret n != 0 and even{n - 1}\n")
+    fork = base.fork()
+    self.assertIsNot(fork["even"], base["even"])
+    self.assertIs(fork["even"].__globals__, fork.scope.globals)
+    self.assertIs(fork["odd"].__closure__[0].cell_contents, fork["even"])
+    self.assertTrue(fork.run("even{10}"))
+
+  def test_fork_refuses_classes_assigning_globals(self):
+    base = Session()
+    base.run("n = 0\nclass C:\n  inc${self}:\n    global n\n    n += 1\n")
+    with self.assertRaises(ValueError):
+      base.fork()
+
+
+if __name__ == "__main__":
+  unittest.main()